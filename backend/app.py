@@ -1,20 +1,37 @@
-from chalice import Chalice
+from chalice import Chalice, Response
 import json
-import feedparser
 import logging
-import uuid
-import re
-import requests
 import hashlib
-from bs4 import BeautifulSoup
-from newspaper import Article
-import time
-import boto3
 import base64
-from botocore.exceptions import ClientError
 import os
+import re
+import time
 from dotenv import load_dotenv, find_dotenv
-import html
+from chalicelib import fetcher, metrics
+from chalicelib.lazy import LazyObject, lazy_import
+from chalicelib.feed_cache import FeedCache
+from chalicelib.articles import articles_from_feed, custom_articles_from_feed
+from chalicelib.normalize import strip_markup
+from chalicelib.ingest import ArticleStore, IngestScheduler
+from chalicelib.registry import CategoryRegistry
+from chalicelib.identity import DedupIndex, dedupe, normalize_url
+from chalicelib.article_cache import ArticleCache
+from chalicelib.extract import ExtractionError, extract_article
+from chalicelib.batch import BATCH_MAX_URLS, iter_extract
+from chalicelib.cache import create_cache
+from chalicelib.retrieval import select_context
+from chalicelib.prompt import PromptBuilder
+from chalicelib.inference import InferenceClient, generated_text
+from chalicelib.streaming import StopPhraseFilter
+from chalicelib.singleflight import SingleFlight
+from chalicelib.translation import TRANSLATE_MAX_CHARS, translate_document
+from chalicelib.sentiment import ComprehendAnalyzer, SentimentError, SentimentService, text_key
+from chalicelib.local_analysis import LocalAnalyzer
+from chalicelib.speech import (AUDIO_URLS_ENABLED, SPEECH_MAX_CHARS, AudioCache, SpeechError, parse_range,
+                              split_for_speech, synthesize_chunks)
+from chalicelib.resilience import CircuitBreaker, CircuitOpenError
+from chalicelib.search import SearchIndex
+from chalicelib.pagination import InvalidPageRequest, decode_cursor, merge_page, ndjson_lines, paginate, parse_limit
 
 dotenv_path = find_dotenv()
 load_dotenv(dotenv_path)
@@ -23,13 +40,27 @@ app = Chalice(app_name='backend')
 app.debug = True
 app.api.cors = True
 
-# Initialize AWS clients
-polly_client = boto3.client('polly')
-translate_client = boto3.client('translate')
+# Heavy dependencies load on first use, a cold start only pays for what
+# the request needs
+boto3 = lazy_import('boto3')
+botocore_config = lazy_import('botocore.config')
+botocore_exceptions = lazy_import('botocore.exceptions')
+requests = lazy_import('requests')
+
+# AWS clients are built by the first request that uses them
+polly_client = LazyObject(lambda: boto3.client('polly'))
+translate_client = LazyObject(lambda: boto3.client('translate'))
+# Short timeouts so a slow Comprehend trips its breaker instead of holding requests
+comprehend_client = LazyObject(lambda: boto3.client('comprehend', config=botocore_config.Config(
+    connect_timeout=2, read_timeout=5, retries={'max_attempts': 2}
+)))
 
 # Initialize Hugging Face API key from env file
 HF_API_KEY = os.getenv('HF_API_KEY')
 
+# Pooled client for the inference API with a circuit breaker
+inference_client = LazyObject(lambda: InferenceClient(HF_API_KEY))
+
 # Free tier models that work well for chat - updated with smaller models
 HF_MODELS = {
     "default": "google/flan-t5-large",         # Smaller than Mistral but still powerful
@@ -40,21 +71,159 @@ HF_MODELS = {
 # Choose which model to use
 DEFAULT_MODEL = HF_MODELS["default"]
 
-# Simple in-memory cache for responses
-response_cache = {}
+# Prompt size budgets in characters (about 4 per token) for each model's input window
+MODEL_PROMPT_BUDGETS = {
+    HF_MODELS["default"]: 2400,   # T5 models take 512 input tokens
+    HF_MODELS["small"]: 2400,
+    HF_MODELS["large"]: 6000      # OPT takes 2048 tokens, leave room for the answer
+}
+prompt_builder = PromptBuilder(MODEL_PROMPT_BUDGETS)
+
+# Model output is cut at these, whether it arrives whole or streamed
+RESPONSE_PREFIXES = ["Assistant:", "Answer:"]
+STOP_PHRASES = ["User:", "Human:", "<s>", "[INST]", "Question:"]
+
+# Chat responses, bounded by bytes with a short TTL for fallback answers.
+# CHAT_CACHE_BACKEND=sqlite shares the cache between local worker processes
+CHAT_CACHE_TTL = float(os.getenv('CHAT_CACHE_TTL', '3600'))
+CHAT_FALLBACK_TTL = float(os.getenv('CHAT_FALLBACK_TTL', '60'))
+response_cache = create_cache(
+    os.getenv('CHAT_CACHE_BACKEND', 'memory'),
+    ttl=CHAT_CACHE_TTL,
+    max_bytes=int(os.getenv('CHAT_CACHE_MAX_BYTES', str(16 * 1024 * 1024))),
+    path=os.getenv('CHAT_CACHE_PATH', '/tmp/intellifeed/chat-cache.sqlite3')
+)
+
+# Parsed RSS feeds keyed by URL, revalidated with conditional requests
+feed_cache = FeedCache()
+
+# Extracted article content keyed by normalized URL, in memory and on disk
+article_cache = ArticleCache()
+ARTICLE_FALLBACK_TTL = 3600
+
+# Identical expensive calls that are in flight at the same time (a breaking
+# story opened by many readers at once) share one upstream call
+inflight = SingleFlight()
+
+# Synthesized speech, content-addressed by text and voice
+audio_cache = AudioCache()
+AUDIO_ID_RE = re.compile(r'[0-9a-f]{64}')
+
+# Translated segments keyed by (segment hash, source, target)
+translation_cache = create_cache(
+    os.getenv('TRANSLATION_CACHE_BACKEND', 'memory'),
+    ttl=float(os.getenv('TRANSLATION_CACHE_TTL', str(7 * 24 * 3600))),
+    max_bytes=int(os.getenv('TRANSLATION_CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+    path=os.getenv('TRANSLATION_CACHE_PATH', '/tmp/intellifeed/translation-cache.sqlite3')
+)
+
+# Whole-article sentiment, cached by article hash and language. English
+# text is answered locally while Comprehend is failing or slow
+sentiment_analyzer = ComprehendAnalyzer(comprehend_client, cache=create_cache(
+    os.getenv('SENTIMENT_CACHE_BACKEND', 'memory'),
+    ttl=float(os.getenv('SENTIMENT_CACHE_TTL', str(24 * 3600))),
+    max_bytes=int(os.getenv('SENTIMENT_CACHE_MAX_BYTES', str(8 * 1024 * 1024))),
+    path=os.getenv('SENTIMENT_CACHE_PATH', '/tmp/intellifeed/sentiment-cache.sqlite3')
+))
+sentiment_service = SentimentService(
+    sentiment_analyzer, LocalAnalyzer(), CircuitBreaker('Amazon Comprehend', reset_timeout=60)
+)
 
 # --- Load Categories from JSON ---
+# Loaded once and reloaded only when rss_feeds.json changes
+category_registry = CategoryRegistry('rss_feeds.json')
+
 def load_categories():
+    snapshot = category_registry.get()
+    return snapshot.categories if snapshot else None
+
+# Articles per /timeline page when no limit is given
+TIMELINE_DEFAULT_LIMIT = int(os.getenv('TIMELINE_DEFAULT_LIMIT', '50'))
+
+# Every article seen so far by its stable ID, shared by all feeds
+article_index = DedupIndex()
+
+# Full-text index over every ingested article, and the bodies of the
+# articles extracted so far
+search_index = SearchIndex()
+SEARCH_DEFAULT_LIMIT = 20
+
+# Latest articles per category, polled in the background
+article_store = ArticleStore(index=article_index, search=search_index)
+ingest_scheduler = IngestScheduler(
+    load_categories,
+    article_store,
+    articles_from_feed,
+    # The scheduler decides when to poll, so always revalidate with the upstream
+    fetch=lambda url, timeout: fetch_feed(url, timeout, max_age=0)
+)
+
+def fetch_feed(url, timeout, max_age=None):
+    """
+    feed_cache.fetch, shared with any poll of the same feed already running.
+    The first background cycle and the inline poll of a cold category want
+    the same feeds at the same time, each is downloaded once.
+    """
+    return inflight.do(("feed", url), feed_cache.fetch, url, timeout=timeout, max_age=max_age)
+
+# --- Metrics ---
+# Request latency per route, read at /metrics. METRICS_ENABLED=0 skips all recording
+@app.middleware('http')
+def record_request_metrics(event, get_response):
+    if not metrics.registry.enabled:
+        return get_response(event)
+    started = time.perf_counter()
+    status = 500
     try:
-        with open('rss_feeds.json', 'r') as f:
-            data = json.load(f)
-        return data
-    except FileNotFoundError:
-        app.log.error("rss_feeds.json not found")
-        return None
-    except json.JSONDecodeError:
-        app.log.error("Invalid JSON format in rss_feeds.json")
-        return None
+        response = get_response(event)
+        status = response.status_code
+        return response
+    finally:
+        route = event.context.get('resourcePath', event.path)
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - started, route=route, method=event.method)
+        metrics.inc('http_requests_total', route=route, method=event.method, status=status)
+
+def collect_metrics():
+    """
+    Cache, single-flight and circuit breaker figures, read from the objects
+    that keep them when /metrics is scraped.
+    """
+    caches = {
+        "feed": feed_cache.stats,
+        "article": article_cache.stats,
+        "audio": audio_cache.stats,
+        "chat": response_cache.stats(),
+        "translation": translation_cache.stats(),
+        "sentiment": sentiment_analyzer.cache.stats(),
+    }
+    events, usage = [], []
+    for cache, stats in caches.items():
+        for name, value in stats.items():
+            if name in ('entries', 'bytes'):
+                usage.append(({"cache": cache, "unit": name}, value))
+            elif name != 'hit_rate':
+                events.append(({"cache": cache, "event": name}, value))
+    yield 'cache_events_total', 'counter', "Cache lookups and writes, by cache and outcome.", events
+    yield 'cache_usage', 'gauge', "Entries and bytes held by each cache.", usage
+
+    yield 'search_documents', 'gauge', "Articles in the search index.", [({}, len(search_index))]
+
+    yield 'singleflight_calls_total', 'counter', "Coalesced calls that ran or shared a result in flight.", [
+        ({"result": "ran"}, inflight.stats["calls"]),
+        ({"result": "shared"}, inflight.stats["shared"]),
+    ]
+
+    # Don't build the inference client just to read its breaker
+    breakers = {"comprehend": sentiment_service.breaker}
+    if inference_client.loaded:
+        breakers["inference"] = inference_client.breaker
+    yield 'circuit_breaker_state', 'gauge', "1 for the current state of each circuit breaker.", [
+        ({"upstream": upstream, "state": state}, int(breaker.state == state))
+        for upstream, breaker in breakers.items()
+        for state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)
+    ]
+
+metrics.add_collector(collect_metrics)
 
 # --- API Endpoints ---
 @app.route('/categories')
@@ -63,13 +232,14 @@ def get_categories():
     Returns the list of news categories and sources.
     This does NOT include the actual news articles.
     """
-    categories = load_categories()
-    if categories:
-        # Structure the response to match what the frontend expects
-        response = {}
-        for category, sources in categories.items():
-            response[category] = [{"source_name": source["source_name"]} for source in sources]
-        return response
+    snapshot = category_registry.get()
+    if snapshot and snapshot.categories:
+        # The response body is serialized once per version of the file
+        return Response(
+            body=snapshot.categories_payload,
+            status_code=200,
+            headers={'Content-Type': 'application/json'}
+        )
     else:
         return {"error": "Could not load categories"}, 500
 
@@ -77,6 +247,8 @@ def get_categories():
 def get_feeds(category):
     """
     Fetches and returns the latest news feeds for a given category.
+    Pass limit (and the returned next_cursor) to page through the articles
+    newest first, and format=ndjson for one JSON article per line.
     """
     categories = load_categories()
     if not categories:
@@ -84,50 +256,140 @@ def get_feeds(category):
     if category not in categories:
         return {"error": "Category not found"}, 404
 
-    all_articles = []
-    for source in categories[category]:
-        try:
-            feed = feedparser.parse(source["source_link"])
-            for entry in feed.entries:
-                article_id = str(uuid.uuid4())
-
-                # Clean the title
-                title = entry.title
-                if title:
-                    title = title.replace("&#8220;", "\"")
-                    title = title.replace("&#8221;", "\"")
-                    title = title.replace("&#8217;", "'")
-                    title = title.replace("&#8230;", "...")
-                    title = re.sub(r'\[\s*\.\.\.\s*\]$', '', title)
-                    title = re.sub(r'<[^>]*?>', '', title)
-
-                # Clean the summary
-                summary = entry.summary if hasattr(entry, 'summary') else None
-                if summary:
-                    summary = summary.replace("&#8220;", "\"")
-                    summary = summary.replace("&#8221;", "\"")
-                    summary = summary.replace("&#8217;", "'")
-                    summary = summary.replace("&#8230;", "...")
-                    summary = re.sub(r'\[\s*\.\.\.\s*\]$', '', summary)
-                    summary = re.sub(r'<[^>]*?>', '', summary)
-                    summary += "..."
-
-                article = {
-                    "id": article_id,
-                    "category": category,
-                    "source_name": source["source_name"],
-                    "title": title,
-                    "link": entry.link,
-                    "summary": summary,
-                    "published": entry.published if hasattr(entry, 'published') else None
-                }
-                all_articles.append(article)
-        except Exception as e:
-            app.log.error(f"Error fetching feed from {source['source_link']}: {e}")
-            # Consider: You might want to handle errors more granularly
-            # and perhaps return a partial list of articles.
-
-    return {"category": category, "articles": all_articles}
+    params = app.current_request.query_params or {}
+    cursor = params.get('cursor')
+    try:
+        limit = parse_limit(params.get('limit'))
+        if cursor:
+            decode_cursor(cursor)
+    except InvalidPageRequest as e:
+        return {"error": str(e)}, 400
+
+    # Articles come from the in-memory store kept current by the ingestion
+    # scheduler, a category is only fetched inline before its first poll
+    ingest_scheduler.start()
+    cold = not ingest_scheduler.running or not article_store.has(category)
+
+    if params.get('format') == 'ndjson':
+        lines = iter_feed_ndjson(category, categories[category], cold, limit, cursor)
+        return Response(body=''.join(lines), status_code=200, headers={'Content-Type': 'application/x-ndjson'})
+
+    if cold:
+        ingest_scheduler.ingest_category(category, fetch=fetch_feed)
+    all_articles, failed_sources = article_store.read(category, categories[category])
+
+    if limit or cursor:
+        page, next_cursor = paginate(all_articles, limit, cursor)
+        return {"category": category, "articles": page, "failed_sources": failed_sources, "next_cursor": next_cursor}
+
+    return {"category": category, "articles": all_articles, "failed_sources": failed_sources}
+
+def iter_feed_ndjson(category, sources, cold, limit, cursor):
+    """
+    Yield a category as NDJSON: one line per article, then a last line with
+    the failed sources and the next cursor.
+    Unpaginated, each source's articles are yielded as soon as that source
+    is parsed instead of after the whole category.
+    """
+    if limit or cursor:
+        if cold:
+            ingest_scheduler.ingest_category(category, fetch=fetch_feed)
+        all_articles, failed_sources = article_store.read(category, sources)
+        page, next_cursor = paginate(all_articles, limit, cursor)
+        yield from ndjson_lines(page)
+    else:
+        if cold:
+            ready_sources = ingest_scheduler.iter_ingest_category(category, fetch=fetch_feed)
+        else:
+            ready_sources = iter(sources)
+        seen = set()
+        for source in ready_sources:
+            articles, _ = article_store.read(category, [source])
+            unseen = [article for article in articles if article["id"] not in seen]
+            seen.update(article["id"] for article in unseen)
+            yield from ndjson_lines(unseen)
+        _, failed_sources = article_store.read(category, sources)
+        next_cursor = None
+
+    yield from ndjson_lines([{"category": category, "failed_sources": failed_sources, "next_cursor": next_cursor}])
+
+@app.route('/timeline')
+def get_timeline():
+    """
+    Returns the newest articles across all categories, or across the comma
+    separated categories parameter, as one timeline. Pages with limit and
+    next_cursor like /feeds, format=ndjson for one JSON article per line.
+    """
+    categories = load_categories()
+    if not categories:
+        return {"error": "Could not load categories"}, 500
+
+    params = app.current_request.query_params or {}
+    if params.get('categories'):
+        requested = list(dict.fromkeys(name.strip() for name in params['categories'].split(',') if name.strip()))
+    else:
+        requested = list(categories)
+    unknown = [name for name in requested if name not in categories]
+    if unknown:
+        return {"error": f"Category not found: {', '.join(unknown)}"}, 404
+
+    cursor = params.get('cursor')
+    try:
+        limit = parse_limit(params.get('limit')) or TIMELINE_DEFAULT_LIMIT
+        if cursor:
+            decode_cursor(cursor)
+    except InvalidPageRequest as e:
+        return {"error": str(e)}, 400
+
+    ingest_cold_categories(requested)
+
+    # Each source's articles are stored newest first, merging their heads
+    # finds the page without sorting or copying the rest
+    runs, failed_sources = article_store.sorted_runs([(name, categories[name]) for name in requested])
+    with metrics.span('timeline_merge'):
+        page, next_cursor = merge_page(runs, limit, cursor)
+
+    if params.get('format') == 'ndjson':
+        lines = ndjson_lines(page + [{"categories": requested, "failed_sources": failed_sources, "next_cursor": next_cursor}])
+        return Response(body=''.join(lines), status_code=200, headers={'Content-Type': 'application/x-ndjson'})
+
+    return {"categories": requested, "articles": page, "failed_sources": failed_sources, "next_cursor": next_cursor}
+
+def ingest_cold_categories(names):
+    """
+    Polls the categories the scheduler hasn't covered yet, all of them
+    together, and waits for the results.
+    """
+    ingest_scheduler.start()
+    cold = [name for name in names if not ingest_scheduler.running or not article_store.has(name)]
+    if cold:
+        ingest_scheduler.ingest_categories(cold, fetch=fetch_feed)
+
+@app.route('/search')
+def search_articles():
+    """
+    Full-text search over the titles, summaries and extracted text of the
+    ingested articles. q takes words, which must all match, and "quoted
+    phrases". categories (comma separated) and limit narrow the results,
+    the most relevant come first.
+    """
+    params = app.current_request.query_params or {}
+    query = (params.get('q') or '').strip()
+    if not query:
+        return {"error": "Query parameter q is required"}, 400
+    try:
+        limit = parse_limit(params.get('limit')) or SEARCH_DEFAULT_LIMIT
+    except InvalidPageRequest as e:
+        return {"error": str(e)}, 400
+    categories = [name.strip() for name in params.get('categories', '').split(',') if name.strip()]
+
+    # The index is filled as feeds are ingested, make sure the configured
+    # categories searched have been polled once
+    configured = load_categories() or {}
+    ingest_cold_categories([name for name in (categories or configured) if name in configured])
+    with metrics.span('search'):
+        results, total = search_index.search(query, categories=categories, limit=limit)
+    return {"query": query, "total": total, "results": results}
 
 @app.route('/custom-feed', methods=['POST'])
 def get_custom_feed():
@@ -142,20 +404,11 @@ def get_custom_feed():
     feed_title = request_body.get('title', 'Custom Feed')
     
     try:
-        # Add proper headers to mimic a browser request
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'application/rss+xml, application/xml, text/xml, */*'
-        }
-        
-        # First fetch the content with requests which supports timeouts
+        # Fetch through the feed cache, which uses requests with timeouts and
+        # only downloads the feed again when the upstream has changed
         try:
-            response = requests.get(feed_url, headers=headers, timeout=15)
-            response.raise_for_status()  # Raise an exception for bad status codes
-            
-            # Then parse the content with feedparser
-            feed = feedparser.parse(response.content)
-        except requests.RequestException as e:
+            feed = feed_cache.fetch(feed_url, timeout=15)
+        except (requests.RequestException, fetcher.FetchTimeout) as e:
             app.log.error(f"Error fetching feed: {str(e)}")
             return {"error": f"Failed to fetch feed: {str(e)}"}, 500
         
@@ -170,69 +423,11 @@ def get_custom_feed():
             app.log.error(f"No entries found in feed: {feed_url}")
             return {"error": "No articles found in this feed"}, 404
             
-        all_articles = []
-        for entry in feed.entries:
-            article_id = str(uuid.uuid4())
-
-            # Clean the title
-            title = entry.title if hasattr(entry, 'title') else "Untitled"
-            if title:
-                title = title.replace("&#8220;", "\"")
-                title = title.replace("&#8221;", "\"")
-                title = title.replace("&#8217;", "'")
-                title = title.replace("&#8230;", "...")
-                title = re.sub(r'\[\s*\.\.\.\s*\]$', '', title)
-                title = re.sub(r'<[^>]*?>', '', title)
-
-            # Extract summary - try different fields as feeds vary
-            summary = None
-            if hasattr(entry, 'summary'):
-                summary = entry.summary
-            elif hasattr(entry, 'description'):
-                summary = entry.description
-            elif hasattr(entry, 'content') and entry.content:
-                summary = entry.content[0].value if hasattr(entry.content[0], 'value') else str(entry.content[0])
-            
-            # If still no summary, use a placeholder
-            if not summary:
-                summary = "No summary available."
-
-            # Clean the summary
-            if summary:
-                summary = summary.replace("&#8220;", "\"")
-                summary = summary.replace("&#8221;", "\"")
-                summary = summary.replace("&#8217;", "'")
-                summary = summary.replace("&#8230;", "...")
-                summary = re.sub(r'\[\s*\.\.\.\s*\]$', '', summary)
-                summary = re.sub(r'<[^>]*?>', '', summary)
-                if len(summary) > 300:
-                    summary = summary[:297] + "..."
-                elif not summary.endswith("..."):
-                    summary += "..."
-
-            # Handle publication date
-            published = None
-            if hasattr(entry, 'published'):
-                published = entry.published
-            elif hasattr(entry, 'updated'):
-                published = entry.updated
-            elif hasattr(entry, 'pubDate'):
-                published = entry.pubDate
-            else:
-                # Use current time if no date available
-                published = time.strftime("%a, %d %b %Y %H:%M:%S %z", time.localtime())
-
-            article = {
-                "id": article_id,
-                "category": "Custom",
-                "source_name": feed_title,
-                "title": title,
-                "link": entry.link if hasattr(entry, 'link') else "#",
-                "summary": summary,
-                "published": published
-            }
-            all_articles.append(article)
-            
+        all_articles = dedupe(custom_articles_from_feed(feed, feed_title))
+        for article in all_articles:
+            article_index.register(article)
+        search_index.add_many(all_articles)
+
         return {
             "category": "Custom",
             "source_name": feed_title,
@@ -246,128 +441,135 @@ def get_custom_feed():
 @app.route('/article', methods=['POST'])
 def get_article_content():
     """
-    Scrapes and returns the full content of an article given its URL.
+    Scrapes and returns the full content of an article given its URL or ID.
     """
     request_body = app.current_request.json_body
-    if not request_body or 'url' not in request_body:
+    if not request_body or ('url' not in request_body and 'id' not in request_body):
         return {"error": "URL is required"}, 400
 
-    url = request_body['url']
+    # Articles from the feeds can also be requested by their stable ID
+    url = request_body.get('url')
+    if not url:
+        indexed = article_index.lookup(request_body['id'])
+        if not indexed:
+            return {"error": "Article not found"}, 404
+        url = indexed["link"]
 
-    try:
-        # Use newspaper3k to extract article content
-        article = Article(url)
-        article.download()
-        # Add a small delay to ensure download completes
-        time.sleep(1)
-        article.parse()
-
-        # Get the main image if available
-        top_image = article.top_image if hasattr(article, 'top_image') else None
-
-        # Format the article content as HTML, but don't include the top image in the content
-        # since we'll handle it separately in the frontend
-        html_content = f"""
-        <div class="article-content">
-            <div class="article-text">
-                {article.text.replace('\n', '<br />')}
-            </div>
-        </div>
-        """
-
-        # Detect language using Amazon Comprehend (simplified for now)
-        detected_language = "en"  # Default to English
+    # Many readers open the same story, serve repeats from the cache
+    cached = article_cache.get(url)
+    if cached is not None:
+        index_article_body(url, cached)
+        return {**cached, "url": url}
 
-        return {
-            "url": url,
-            "title": article.title,
-            "content": html_content,
-            "authors": article.authors,
-            "publish_date": article.publish_date.isoformat() if article.publish_date else None,
-            "top_image": top_image,
-            "detected_language": detected_language
-        }
-    except Exception as e:
+    return inflight.do(("article", normalize_url(url)), load_article, url)
+
+def load_article(url):
+    """
+    Scrapes an article and caches the result.
+    """
+    result = scrape_article(url)
+    if isinstance(result, dict):
+        # Fallback extractions are worse, retry them sooner
+        article_cache.put(url, result, ttl=ARTICLE_FALLBACK_TTL if result.get("fallback") else None)
+        index_article_body(url, result)
+    return result
+
+def index_article_body(url, result):
+    """
+    Makes the text of an extracted article searchable, if the article came
+    from one of the feeds.
+    """
+    if result.get("content"):
+        search_index.add_body(url, strip_markup(result["content"]))
+
+def scrape_article(url):
+    """
+    Extracts the content of an article, downloading the page only once for
+    newspaper3k and the BeautifulSoup fallback.
+    """
+    try:
+        result, timings = extract_article(url)
+    except ExtractionError as e:
         app.log.error(f"Error scraping article from {url}: {str(e)}")
-        # Fallback method using BeautifulSoup if newspaper3k fails
+        return {"error": f"Failed to scrape article: {str(e)}"}, 500
+    app.log.info(f"Extracted {url} in " + ", ".join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in timings.items()))
+    return result
+
+@app.route('/articles', methods=['POST'])
+def get_articles_batch():
+    """
+    Extracts many articles at once, given as urls, ids, or a category whose
+    newest stories (limit, default 10) should be pre-extracted.
+    Pages are downloaded concurrently and parsed on a process pool, results
+    are listed in the order they completed.
+    """
+    request_body = app.current_request.json_body
+    if not request_body or not (request_body.get('urls') or request_body.get('ids') or request_body.get('category')):
+        return {"error": "URLs are required"}, 400
+
+    for field in ('urls', 'ids'):
+        values = request_body.get(field) or []
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            return {"error": f"{field} must be a list of strings"}, 400
+    category = request_body.get('category')
+    if category is not None and not isinstance(category, str):
+        return {"error": "category must be a string"}, 400
+
+    urls = list(request_body.get('urls') or [])
+    # Articles from the feeds can also be requested by their stable ID
+    for article_id in request_body.get('ids') or []:
+        indexed = article_index.lookup(article_id)
+        if indexed:
+            urls.append(indexed["link"])
+    # Or as the newest stories of a category, polled first if it is cold
+    if category:
+        categories = load_categories() or {}
+        if category not in categories:
+            return {"error": "Category not found"}, 404
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-
-            # Find the main content (this is a simple approach and might need customization)
-            main_content = soup.find('article') or soup.find('main') or soup.find('div', class_='content')
-
-            # Try to extract author information
-            author_elements = soup.select('.author, .byline, [rel="author"], [itemprop="author"]')
-            authors = []
-            for el in author_elements:
-                if el.text and len(el.text.strip()) > 0:
-                    authors.append(el.text.strip())
-
-            # Try to find a top image
-            top_image = None
-            img_elements = soup.select('article img, .featured-image img, [itemprop="image"]')
-            if img_elements and len(img_elements) > 0:
-                for img in img_elements:
-                    if img.get('src') and (img.get('width') is None or int(img.get('width', '0')) > 300):
-                        top_image = img.get('src')
-                        # Remove this image from the content to avoid duplication
-                        img.decompose()
-                        break
-
-            if main_content:
-                content_html = str(main_content)
-            else:
-                # If no clear content container, get the body and clean it
-                body = soup.find('body')
-                if body:
-                    # Remove navigation, header, footer, etc.
-                    for nav in body.find_all(['nav', 'header', 'footer', 'aside']):
-                        nav.decompose()
-                    content_html = str(body)
-                else:
-                    content_html = "<p>Could not extract article content.</p>"
-
-            # Detect language (simplified for now)
-            detected_language = "en"  # Default to English
-
-            return {
-                "url": url,
-                "content": content_html,
-                "authors": authors,
-                "top_image": top_image,
-                "detected_language": detected_language,
-                "fallback": True
-            }
-        except Exception as fallback_error:
-            app.log.error(f"Fallback scraping failed for {url}: {str(fallback_error)}")
-            return {"error": f"Failed to scrape article: {str(e)}"}, 500
+            limit = parse_limit(request_body.get('limit', 10))
+        except InvalidPageRequest as e:
+            return {"error": str(e)}, 400
+        ingest_cold_categories([category])
+        articles, _ = article_store.read(category, categories[category])
+        top_stories, _ = paginate(articles, limit)
+        urls.extend(article["link"] for article in top_stories)
+    if len(urls) > BATCH_MAX_URLS:
+        return {"error": f"At most {BATCH_MAX_URLS} articles can be requested at once"}, 400
+
+    results = []
+    for index, url, result, error in iter_extract(urls, cache=article_cache, fallback_ttl=ARTICLE_FALLBACK_TTL):
+        if error:
+            app.log.error(f"Error scraping article from {url}: {error}")
+            results.append({"index": index, "url": url, "error": f"Failed to scrape article: {error}"})
+        else:
+            index_article_body(url, result)
+            results.append({"index": index, **result})
+    return {"results": results}
 
 @app.route('/text-to-speech', methods=['POST'])
 def text_to_speech():
     """
     Converts article text to speech using Amazon Polly.
+    The whole text is read, long articles are synthesized in parallel chunks.
+    response_format is "json" (base64 audio, the default), "url" (only the
+    audio_url to fetch or stream it from, where audio URLs are enabled) or
+    "binary" (raw audio/mpeg).
     """
     request_body = app.current_request.json_body
     if not request_body or 'text' not in request_body:
         return {"error": "Text is required"}, 400
 
     text = request_body['text']
+    if len(text) > SPEECH_MAX_CHARS:
+        return {"error": f"Text must be at most {SPEECH_MAX_CHARS} characters"}, 400
+    response_format = request_body.get('response_format', 'json')
+    if response_format == 'url' and not AUDIO_URLS_ENABLED:
+        return {"error": "Audio URLs are not available on this deployment, use json or binary"}, 400
     voice_id = request_body.get('voice_id', 'Joanna')  # Default to Joanna voice
     language_code = request_body.get('language_code', 'en')  # Get language code from request
 
     try:
-        # Limit text length to avoid exceeding Polly limits
-        if len(text) > 3000:
-            text = text[:3000] + "..."
-
         # Map of language codes to Amazon Polly language codes
         # Some languages need specific format for Polly
         language_mapping = {
@@ -409,80 +611,108 @@ def text_to_speech():
         if language_code in voice_mapping:
             voice_id = voice_mapping[language_code]
 
-        # Configure the speech synthesis request
+        # Polly settings shared by every chunk of the text
         synthesis_params = {
-            'Text': text,
             'OutputFormat': 'mp3',
             'VoiceId': voice_id,
-            'Engine': 'neural'  # Use neural engine for better quality
+            'Engine': 'neural',  # Use neural engine for better quality
+            'LanguageCode': polly_language
         }
 
-        # For certain languages, explicitly set LanguageCode
-        synthesis_params['LanguageCode'] = polly_language
-
-        app.log.info(f"Synthesizing speech with params: {synthesis_params}")
-
-        # Call Amazon Polly to synthesize speech
-        response = polly_client.synthesize_speech(**synthesis_params)
-
-        # Get the audio stream from the response
-        if "AudioStream" in response:
-            # Read the audio stream and encode as base64
-            audio_data = response["AudioStream"].read()
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-
-            return {
-                "success": True,
-                "audio": audio_base64,
-                "content_type": "audio/mpeg"
-            }
-        else:
-            return {"error": "Failed to generate audio"}, 500
-    except ClientError as e:
+        # Audio is cached by content, the same text and voice is only synthesized once
+        audio_id = audio_cache.key(text, voice_id, polly_language)
+        audio_data = audio_cache.get(audio_id)
+        if audio_data is None:
+            # Concurrent identical requests share the synthesis
+            audio_data = inflight.do(("speech", audio_id), synthesize_audio, audio_id, text, synthesis_params)
+    except (botocore_exceptions.ClientError, SpeechError) as e:
         app.log.error(f"Error calling Amazon Polly: {str(e)}")
         return {"error": f"Failed to generate speech: {str(e)}"}, 500
 
+    if response_format == 'binary':
+        # Raw MP3 without the base64 overhead
+        return audio_response(audio_data)
+    response = {
+        "success": True,
+        "audio_id": audio_id,
+        "content_type": "audio/mpeg"
+    }
+    if AUDIO_URLS_ENABLED:
+        response["audio_url"] = f"/audio/{audio_id}"
+    if response_format != 'url':
+        response["audio"] = base64.b64encode(audio_data).decode('utf-8')
+    return response
+
+def synthesize_audio(audio_id, text, synthesis_params):
+    """
+    Synthesizes the full text with Amazon Polly in parallel sentence-aligned
+    chunks and caches the joined MP3.
+    """
+    chunks = split_for_speech(text)
+    if not chunks:
+        raise SpeechError("No text to synthesize")
+    app.log.info(f"Synthesizing {len(text)} chars in {len(chunks)} chunk(s) with voice {synthesis_params['VoiceId']}")
+    audio_data = synthesize_chunks(polly_client, chunks, synthesis_params)
+    audio_cache.put(audio_id, audio_data)
+    return audio_data
+
+@app.route('/audio/{audio_id}', methods=['GET'])
+def get_audio(audio_id):
+    """
+    Serves synthesized audio from the cache, with Range support for seeking.
+    """
+    if not AUDIO_URLS_ENABLED or not AUDIO_ID_RE.fullmatch(audio_id):
+        return {"error": "Audio not found"}, 404
+    audio_data = audio_cache.get(audio_id)
+    if audio_data is None:
+        return {"error": "Audio not found"}, 404
+    return audio_response(audio_data, app.current_request.headers.get('range'))
+
+def audio_response(audio_data, range_header=None):
+    """
+    Binary MP3 response, a partial one if a satisfiable Range was requested.
+    """
+    headers = {'Content-Type': 'audio/mpeg', 'Accept-Ranges': 'bytes'}
+    byte_range = parse_range(range_header, len(audio_data))
+    if byte_range is None:
+        return Response(body=audio_data, status_code=200, headers=headers)
+    start, end = byte_range
+    headers['Content-Range'] = f"bytes {start}-{end}/{len(audio_data)}"
+    return Response(body=audio_data[start:end + 1], status_code=206, headers=headers)
+
 @app.route('/translate', methods=['POST'])
 def translate_text():
     """
-    Translates article text using Amazon Translate.
+    Translates article text using Amazon Translate, however long it is.
     """
     request_body = app.current_request.json_body
     if not request_body or 'text' not in request_body or 'target_language' not in request_body:
         return {"error": "Text and target language are required"}, 400
 
     text = request_body['text']
+    if len(text) > TRANSLATE_MAX_CHARS:
+        return {"error": f"Text must be at most {TRANSLATE_MAX_CHARS} characters"}, 400
     target_language = request_body['target_language']
     source_language = request_body.get('source_language', 'auto')  # Auto-detect if not specified
 
     try:
-        # Limit text length to avoid exceeding Translate limits
-        # Amazon Translate has a limit of 5000 bytes per request
-        if len(text.encode('utf-8')) > 5000:
-            # Truncate text to approximately 5000 bytes
-            text = text.encode('utf-8')[:4900].decode('utf-8', errors='ignore') + "..."
-
-        # Call Amazon Translate to translate the text
-        if source_language == 'auto':
-            response = translate_client.translate_text(
-                Text=text,
-                TargetLanguageCode=target_language
-            )
-        else:
-            response = translate_client.translate_text(
-                Text=text,
-                SourceLanguageCode=source_language,
-                TargetLanguageCode=target_language
-            )
+        # Translate the whole text: paragraphs are sent concurrently in
+        # segments under the request size limit, cached segments are reused
+        translate_key = hashlib.sha256(json.dumps([text, source_language, target_language]).encode()).hexdigest()
+        # Concurrent identical requests share one translation
+        translated_text, detected_language = inflight.do(
+            ("translate", translate_key), translate_document,
+            translate_client, text, target_language, source_language=source_language, cache=translation_cache
+        )
 
         # Return the translated text
         return {
             "success": True,
-            "translated_text": response.get('TranslatedText', ''),
-            "source_language": response.get('SourceLanguageCode', source_language),
+            "translated_text": translated_text,
+            "source_language": detected_language,
             "target_language": target_language
         }
-    except ClientError as e:
+    except botocore_exceptions.ClientError as e:
         app.log.error(f"Error calling Amazon Translate: {str(e)}")
         return {"error": f"Failed to translate text: {str(e)}"}, 500
 
@@ -534,15 +764,17 @@ def chat_with_article():
     selected_model_id = request_body.get('model', 'default')
     model = HF_MODELS.get(selected_model_id, DEFAULT_MODEL)
     
-    # Truncate article text to avoid token limits - be more conservative
-    max_article_length = 1800  # Reduced from 2000 to ensure we stay within limits
-    if len(article_text) > max_article_length:
-        app.log.warning(f"Article text truncated from {len(article_text)} to {max_article_length} chars")
-        article_text = article_text[:max_article_length] + "..."
-    
     # Clean the article text to remove any HTML or problematic characters
-    article_text = html.unescape(article_text)
-    article_text = re.sub(r'<[^>]*?>', '', article_text)
+    article_text = strip_markup(article_text)
+    
+    # Keep the article within token limits by packing the passages most
+    # relevant to the latest question instead of only the opening
+    max_article_length = prompt_builder.article_budget(model)
+    if len(article_text) > max_article_length:
+        latest_question = next((msg['content'] for msg in reversed(messages) if msg['role'] == 'user'), "")
+        with metrics.span('chat_context'):
+            article_text = select_context(article_text, latest_question, max_article_length)
+        app.log.info(f"Article text reduced from {article_text_size} to {len(article_text)} chars of relevant passages")
     
     # Prepare the system message with article context
     system_message = f"""You are an AI assistant that helps users understand news articles.
@@ -559,26 +791,47 @@ Keep your responses concise and focused on the article content.
     
     # Check cache first
     cache_key = get_cache_key(messages, system_message)
+    
+    # Stream mode sends the answer as NDJSON lines while it is generated
+    if request_body.get('stream'):
+        # Chalice buffers the body, so the lines are joined before returning
+        # and concurrent duplicates can share the whole body
+        body = inflight.do(("chat-stream", cache_key), lambda: ''.join(
+            iter_chat_stream(messages, system_message, model, cache_key, article_text, article_title)
+        ))
+        return Response(body=body, status_code=200, headers={'Content-Type': 'application/x-ndjson'})
+    
     cached_response = response_cache.get(cache_key)
     if cached_response:
         app.log.info("Using cached response")
         return cached_response
     
+    # Concurrent requests for the same answer wait on one generation
+    return inflight.do(("chat", cache_key), generate_chat_response,
+                       messages, system_message, model, cache_key, article_text, article_title)
+
+def generate_chat_response(messages, system_message, model, cache_key, article_text, article_title):
+    """
+    Generates and caches a chat answer, falling back to the small model and
+    then to a local response when the API fails.
+    """
     try:
         # Generate response using Hugging Face with the selected model
         response = generate_huggingface_response(messages, system_message, model=model)
         # Cache the response
-        response_cache[cache_key] = response
+        response_cache.set(cache_key, response)
         return response
     except Exception as e:
         app.log.error(f"Error generating chat response: {str(e)}")
         app.log.warning(f"Primary model failed: {str(e)}. Trying fallback model...")
         
         try:
-            # Try with a smaller, more reliable model
+            # Try with a smaller, more reliable model, unless the API is known to be down
+            if isinstance(e, CircuitOpenError):
+                raise e
             response = generate_huggingface_response(messages, system_message, model=HF_MODELS["small"])
             # Cache the response
-            response_cache[cache_key] = response
+            response_cache.set(cache_key, response)
             return response
         except Exception as fallback_e:
             app.log.error(f"Fallback model also failed: {str(fallback_e)}")
@@ -593,25 +846,39 @@ Keep your responses concise and focused on the article content.
             }
             
             # Cache this fallback response temporarily (shorter TTL)
-            response_cache[cache_key] = fallback_response
+            response_cache.set(cache_key, fallback_response, ttl=CHAT_FALLBACK_TTL)
             return fallback_response
 
 def generate_huggingface_response(messages, system_message, model=DEFAULT_MODEL):
     """
     Generate a response using Hugging Face's Inference API (free tier).
     """
+    payload = build_generation_payload(messages, system_message, model)
+    
+    # Call the Hugging Face Inference API, retries are bounded by a deadline
+    # and skipped entirely while the circuit breaker is open
+    result = inference_client.generate(model, payload)
+    
+    # Extract the generated text and clean up the response
+    assistant_message = clean_assistant_response(generated_text(result))
+    
+    return {
+        "success": True,
+        "message": assistant_message,
+        "role": "assistant"
+    }
+
+def build_generation_payload(messages, system_message, model):
+    """
+    Build the inference payload for a conversation.
+    """
     # Format the conversation for the model
-    conversation = format_conversation_for_model(messages, system_message, model)
+    with metrics.span('chat_prompt'):
+        conversation = format_conversation_for_model(messages, system_message, model)
     
     # Log the size of the conversation for debugging
     app.log.info(f"Sending request to model {model} with conversation size: {len(conversation)} chars")
     
-    # Call the Hugging Face Inference API
-    headers = {
-        "Authorization": f"Bearer {HF_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
     # Set up base parameters
     payload = {
         "inputs": conversation,
@@ -627,181 +894,81 @@ def generate_huggingface_response(messages, system_message, model=DEFAULT_MODEL)
     if not any(model_name in model.lower() for model_name in ["flan-t5", "t5"]):
         payload["parameters"]["return_full_text"] = False
     
-    # Add retry logic for API calls
-    max_retries = 3
-    for attempt in range(max_retries):
+    return payload
+
+def iter_chat_stream(messages, system_message, model, cache_key, article_text, article_title):
+    """
+    Yield a chat answer as NDJSON while the model generates it: "delta"
+    lines with new text, then a "done" line with the whole message.
+    Stop phrases are applied as the text arrives, generation is cut off as
+    soon as one shows up.
+    """
+    cached_response = response_cache.get(cache_key)
+    if cached_response:
+        app.log.info("Using cached response")
+        yield from ndjson_lines([
+            {"type": "delta", "text": cached_response["message"]},
+            dict(cached_response, type="done")
+        ])
+        return
+    
+    started = time.monotonic()
+    first_token_ms = None
+    parts = []
+    stop_filter = StopPhraseFilter(STOP_PHRASES, prefixes=RESPONSE_PREFIXES)
+    try:
+        pieces = inference_client.stream(model, build_generation_payload(messages, system_message, model))
         try:
-            # Use a longer timeout to accommodate model loading
-            response = requests.post(
-                f"https://api-inference.huggingface.co/models/{model}",
-                headers=headers,
-                json=payload,
-                timeout=30  # Increased timeout
-            )
-            
-            # Check if the model is still loading
-            if response.status_code == 503 and "currently loading" in response.text.lower():
-                app.log.info(f"Model {model} is still loading. Waiting...")
-                time.sleep(10)  # Wait for model to load
-                continue
-                
-            # Check for service unavailability
-            if response.status_code == 503:
-                error_text = response.text[:500] + ("..." if len(response.text) > 500 else "")
-                app.log.error(f"Hugging Face API error: Service unavailable (503)")
-                
-                # If last attempt, raise a specific error for better fallback handling
-                if attempt == max_retries - 1:
-                    raise Exception("Hugging Face service is currently unavailable")
-                    
-                # Otherwise wait and retry
-                wait_time = 5 * (attempt + 1)  # Exponential backoff
-                app.log.warning(f"Attempt {attempt + 1} failed: Service unavailable. Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-                continue
-                
-            # Check for other errors
-            if response.status_code != 200:
-                app.log.error(f"Hugging Face API error: {response.status_code}")
-                raise Exception(f"API returned status code {response.status_code}")
-            
-            result = response.json()
-            
-            # Extract the generated text - adapt extraction for different model responses
-            assistant_message = ""
-            if isinstance(result, list) and len(result) > 0:
-                if "generated_text" in result[0]:
-                    assistant_message = result[0]["generated_text"]
-                else:
-                    assistant_message = result[0]
-            elif isinstance(result, dict):
-                if "generated_text" in result:
-                    assistant_message = result["generated_text"]
-                else:
-                    # For T5 models, the result might be just the text
-                    assistant_message = str(result)
-            else:
-                assistant_message = str(result)
-            
-            # Clean up the response
-            assistant_message = clean_assistant_response(assistant_message)
-            
-            return {
-                "success": True,
-                "message": assistant_message,
-                "role": "assistant"
-            }
-            
-        except requests.exceptions.Timeout:
-            app.log.warning(f"Request timed out on attempt {attempt + 1}")
-            if attempt == max_retries - 1:
-                raise Exception("API request timed out after multiple attempts")
-            time.sleep(2 * (attempt + 1))  # Exponential backoff
-            
-        except Exception as e:
-            if "service is currently unavailable" in str(e).lower() and attempt < max_retries - 1:
-                wait_time = 5 * (attempt + 1)  # Exponential backoff
-                app.log.warning(f"Attempt {attempt + 1} failed: {str(e)}. Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-            else:
-                raise
+            for piece in pieces:
+                text = stop_filter.feed(piece)
+                if text:
+                    if first_token_ms is None:
+                        first_token_ms = round((time.monotonic() - started) * 1000)
+                    parts.append(text)
+                    yield from ndjson_lines([{"type": "delta", "text": text}])
+                if stop_filter.stopped:
+                    break
+        finally:
+            pieces.close()
+        text = stop_filter.finish()
+        if text:
+            parts.append(text)
+            yield from ndjson_lines([{"type": "delta", "text": text}])
+        response = {"success": True, "message": "".join(parts), "role": "assistant"}
+        response_cache.set(cache_key, response)
+    except Exception as e:
+        app.log.error(f"Error streaming chat response: {str(e)}")
+        if parts:
+            # Keep what was already sent, but don't cache a cut off answer
+            response = {"success": True, "message": "".join(parts), "role": "assistant", "truncated": True}
+        else:
+            fallback_message = generate_local_fallback_response(messages, article_text, article_title)
+            response = {"success": True, "message": fallback_message, "role": "assistant", "fallback": True}
+            response_cache.set(cache_key, response, ttl=CHAT_FALLBACK_TTL)
+            yield from ndjson_lines([{"type": "delta", "text": fallback_message}])
     
-    # If we get here, all retries failed
-    raise Exception("All retry attempts failed")
+    app.log.info(f"Streamed chat response, first token after {first_token_ms} ms, total {round((time.monotonic() - started) * 1000)} ms")
+    yield from ndjson_lines([dict(response, type="done", first_token_ms=first_token_ms)])
 
 def format_conversation_for_model(messages, system_message, model):
     """
     Format the conversation based on the model being used.
-    Different models expect different prompt formats.
+    Different models expect different prompt formats, older turns are
+    summarized so the prompt stays within the model's budget.
     """
-    # Check if the model is T5-based
-    is_t5_model = "t5" in model.lower()
-    
-    if "mistral" in model.lower():
-        # Mistral format
-        conversation = f"<s>[INST] {system_message} [/INST]</s>\n\n"
-        
-        for i, msg in enumerate(messages):
-            if msg['role'] == 'system':
-                continue
-            elif msg['role'] == 'user':
-                conversation += f"<s>[INST] {msg['content']} [/INST]"
-            elif msg['role'] == 'assistant':
-                conversation += f" {msg['content']} </s>\n"
-        
-        # Add the final user message if the last message was from the user
-        if messages and messages[-1]['role'] == 'user':
-            conversation += " "
-        
-        return conversation
-        
-    elif "llama" in model.lower() or "opt" in model.lower():
-        # Llama 2 / OPT format - similar with system message
-        conversation = f"<s>[INST] <<SYS>>\n{system_message}\n<</SYS>>\n\n"
-        
-        for i, msg in enumerate(messages):
-            if msg['role'] == 'system':
-                continue
-            elif msg['role'] == 'user':
-                if i > 0 and messages[i-1]['role'] == 'assistant':
-                    conversation += f"[/INST] {messages[i-1]['content']} </s><s>[INST] {msg['content']}"
-                else:
-                    conversation += f"{msg['content']}"
-            elif msg['role'] == 'assistant' and i == len(messages) - 1:
-                conversation += f" [/INST] {msg['content']}"
-        
-        if messages and messages[-1]['role'] == 'user':
-            conversation += " [/INST]"
-            
-        return conversation
-        
-    else:
-        # Generic format for T5 models (FLAN-T5, etc.)
-        # T5 models prefer a more straightforward format
-        if is_t5_model:
-            # For T5, simplify to focus on the question and context
-            user_question = ""
-            for msg in reversed(messages):
-                if msg['role'] == 'user':
-                    user_question = msg['content']
-                    break
-                    
-            # T5 performs better with a targeted prompt that includes the question
-            conversation = f"Answer this question based on the article context.\n\nArticle: {system_message}\n\nQuestion: {user_question}\n\nAnswer:"
-            return conversation
-        else:
-            # For other models, use a more conversational format
-            conversation = f"System: {system_message}\n\n"
-            
-            for msg in messages:
-                if msg['role'] == 'system':
-                    continue
-                elif msg['role'] == 'user':
-                    conversation += f"User: {msg['content']}\n"
-                elif msg['role'] == 'assistant':
-                    conversation += f"Assistant: {msg['content']}\n"
-            
-            # Add the final prompt for the model to continue
-            if messages and messages[-1]['role'] == 'user':
-                conversation += "Assistant: "
-            
-            return conversation
+    return prompt_builder.build(messages, system_message, model)
 
 def clean_assistant_response(text):
     """
     Clean up the assistant's response to remove artifacts and ensure it's properly formatted.
     """
-    # Remove any "Assistant:" prefix that might be in the response
-    if text.startswith("Assistant:"):
-        text = text[len("Assistant:"):].strip()
-    
-    # Remove any "Answer:" prefix from T5 models
-    if text.startswith("Answer:"):
-        text = text[len("Answer:"):].strip()
+    # Remove any "Assistant:" prefix, or "Answer:" from T5 models
+    for prefix in RESPONSE_PREFIXES:
+        if text.startswith(prefix):
+            text = text[len(prefix):].strip()
     
     # Remove any trailing "User:" or similar that might be generated
-    stop_phrases = ["User:", "Human:", "<s>", "[INST]", "Question:"]
-    for phrase in stop_phrases:
+    for phrase in STOP_PHRASES:
         if phrase in text:
             text = text.split(phrase)[0].strip()
     
@@ -819,20 +986,22 @@ def get_cache_key(messages, system_message):
     }, sort_keys=True)
     return hashlib.md5(cache_data.encode()).hexdigest()
 
-import boto3
-from botocore.exceptions import ClientError
-
 @app.route('/sentiment-analysis', methods=['POST'])
 def analyze_sentiment():
     """
-    Analyzes the sentiment of article text using Amazon Comprehend.
+    Analyzes the sentiment and key phrases of the whole article text using
+    Amazon Comprehend, or the local engine.
     """
     request_body = app.current_request.json_body
-    if not request_body or 'text' not in request_body:
+    if not request_body or not str(request_body.get('text') or '').strip():
         return {"error": "Text is required"}, 400
 
     text = request_body['text']
     language_code = request_body.get('language', 'en')
+    # "auto" (default), "comprehend" or "local" for the offline engine
+    engine = request_body.get('engine', 'auto')
+    if engine not in SentimentService.ENGINES:
+        return {"error": f"Engine must be one of {', '.join(SentimentService.ENGINES)}"}, 400
 
     # Map of language codes to Amazon Comprehend language codes
     language_mapping = {
@@ -853,66 +1022,30 @@ def analyze_sentiment():
     # Use English as fallback for unsupported languages
     comprehend_language = language_mapping.get(language_code, 'en')
 
-    try:
-        # Initialize the Comprehend client with explicit region
-        comprehend = boto3.client('comprehend') 
-
-        # Limit text length to avoid exceeding Comprehend limits (5KB)
-        if len(text.encode('utf-8')) > 5000:
-            text = text.encode('utf-8')[:4900].decode('utf-8', errors='ignore') + "..."
+    if engine == 'local' and comprehend_language not in LocalAnalyzer.languages:
+        return {"error": "The local engine only supports English"}, 400
 
-        # Call Amazon Comprehend to analyze sentiment
-        sentiment_response = comprehend.detect_sentiment(
-            Text=text,
-            LanguageCode=comprehend_language
+    try:
+        # The whole article is analyzed in segments with the batch APIs,
+        # concurrent identical requests share one analysis
+        return inflight.do(
+            ("sentiment", engine, text_key(text, comprehend_language)),
+            sentiment_service.analyze, text, comprehend_language, engine
         )
-
-        # Extract sentiment scores
-        sentiment_scores = sentiment_response.get('SentimentScore', {})
-        dominant_sentiment = sentiment_response.get('Sentiment', 'NEUTRAL').lower()
-
-        # Calculate an overall sentiment score from -1 (very negative) to 1 (very positive)
-        positive_score = sentiment_scores.get('Positive', 0)
-        negative_score = sentiment_scores.get('Negative', 0)
-        neutral_score = sentiment_scores.get('Neutral', 0)
-        mixed_score = sentiment_scores.get('Mixed', 0)
-
-        # Calculate sentiment score based on dominant sentiment with proper weighting
-        if dominant_sentiment == 'positive':
-            sentiment_score = positive_score
-        elif dominant_sentiment == 'negative':
-            sentiment_score = -negative_score
-        elif dominant_sentiment == 'mixed':
-            sentiment_score = (positive_score - negative_score) / 2
-        else:  # neutral
-            sentiment_score = 0  # Set neutral sentiment score to 0
-
-        # Also detect key phrases if text is not too long
-        key_phrases = []
-        if len(text.split()) < 1000:  # Increased word limit for key phrases
-            key_phrase_response = comprehend.detect_key_phrases(
-                Text=text,
-                LanguageCode=comprehend_language
-            )
-            key_phrases = [
-                phrase['Text'] for phrase in key_phrase_response.get('KeyPhrases', [])
-                if phrase.get('Score', 0) > 0.5  # Only keep high confidence phrases
-            ][:15]  # Limit to top 15 phrases
-
-        return {
-            "success": True,
-            "dominant_sentiment": dominant_sentiment,
-            "sentiment_score": sentiment_score,
-            "scores": {
-                "positive": sentiment_scores.get('Positive', 0),
-                "negative": sentiment_scores.get('Negative', 0),
-                "neutral": sentiment_scores.get('Neutral', 0),
-                "mixed": sentiment_scores.get('Mixed', 0)
-            },
-            "key_phrases": key_phrases,
-            "language": comprehend_language
-        }
-
-    except ClientError as e:
+    except (botocore_exceptions.ClientError, botocore_exceptions.BotoCoreError, CircuitOpenError, SentimentError) as e:
         app.log.error(f"Error calling Amazon Comprehend: {str(e)}")
-        return {"error": f"Failed to analyze sentiment: {str(e)}"}, 500
\ No newline at end of file
+        return {"error": f"Failed to analyze sentiment: {str(e)}"}, 500
+
+@app.route('/metrics')
+def get_metrics():
+    """
+    Returns request, stage, upstream and cache metrics in the Prometheus
+    text format.
+    """
+    if not metrics.registry.enabled:
+        return {"error": "Metrics are disabled"}, 404
+    return Response(
+        body=metrics.render(),
+        status_code=200,
+        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+    )
@@ -0,0 +1,224 @@
+"""
+End-to-end endpoint benchmark against local stand-ins: synthetic RSS feeds
+and article pages, the fake inference API and fake Polly, Translate and
+Comprehend clients. Reports throughput, p50/p95/p99 latency and memory per
+endpoint.
+
+Requests go through the Chalice test client one at a time, the way a
+Lambda container serves them. --unique sets how many distinct inputs each
+endpoint cycles through, so cache hit rates can be dialed from all misses
+(the default) to all hits (--unique 1).
+
+Run from the backend directory:
+    python -m benchmarks.bench_endpoints
+    python -m benchmarks.bench_endpoints --endpoints chat translate --upstream-latency 0.2 --error-rate 0.1
+    python -m benchmarks.bench_endpoints --save before.json
+    python -m benchmarks.bench_endpoints --compare before.json
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from urllib.parse import quote
+
+from benchmarks.fake_aws import FakeComprehend, FakePolly, FakeTranslate
+from benchmarks.stub_servers import ArticleStub, InferenceStub, RssStub
+
+ENDPOINTS = ('feeds', 'feeds-ndjson', 'timeline', 'search', 'article', 'chat', 'speech', 'translate', 'sentiment', 'sentiment-local')
+
+
+def make_text(variant, paragraphs=8, seed_words=("market", "council", "budget", "energy", "court", "team")):
+    rng = random.Random(variant)
+    return "\n\n".join(
+        " ".join(f"{rng.choice(seed_words).capitalize()} {' '.join(rng.choice(seed_words) for _ in range(14))}." for _ in range(5))
+        for _ in range(paragraphs)
+    )
+
+
+def scenario(name, i, args, stubs, texts):
+    """
+    Request (method, path, body) for the i-th call to an endpoint.
+    """
+    variant = i if not args.unique else i % args.unique
+    if name in ('feeds', 'feeds-ndjson'):
+        if args.fresh_feeds:
+            stubs['rss'].refresh()
+        query = "?format=ndjson" if name == 'feeds-ndjson' else ""
+        return "GET", f"/feeds/Bench{variant % args.categories}{query}", None
+    if name == 'timeline':
+        if args.fresh_feeds:
+            stubs['rss'].refresh()
+        return "GET", "/timeline?limit=50", None
+    if name == 'search':
+        words = ("budget council", "energy", "court ruling", '"city council"', "minister election", "market")
+        return "GET", f"/search?q={quote(words[variant % len(words)])}&categories=Bench{variant % args.categories}", None
+    if name == 'article':
+        return "POST", "/article", {"url": stubs['articles'].article_url(variant)}
+    if name == 'chat':
+        return "POST", "/chat", {
+            "messages": [{"role": "user", "content": f"What happened to the budget, question {variant}?"}],
+            "article_text": texts[0],
+            "article_title": "Bench story"
+        }
+    text = texts[variant % len(texts)] if args.unique else f"{texts[i % len(texts)]} ({i})"
+    if name == 'speech':
+        return "POST", "/text-to-speech", {"text": text, "response_format": "url"}
+    if name == 'translate':
+        return "POST", "/translate", {"text": text, "target_language": "fr"}
+    if name == 'sentiment':
+        return "POST", "/sentiment-analysis", {"text": text, "engine": "comprehend"}
+    return "POST", "/sentiment-analysis", {"text": text, "engine": "local"}
+
+
+def percentile(samples, q):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[q - 1]
+
+
+def max_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def run_endpoint(client, name, args, stubs, texts):
+    latencies = []
+    statuses = {}
+    gc.collect()
+    if args.tracemalloc:
+        tracemalloc.start()
+    started = time.perf_counter()
+    for i in range(args.requests):
+        method, path, body = scenario(name, i, args, stubs, texts)
+        kwargs = {"body": json.dumps(body), "headers": {"content-type": "application/json"}} if body else {}
+        sent = time.perf_counter()
+        response = client.http.request(method, path, **kwargs)
+        latencies.append(time.perf_counter() - sent)
+        # Error responses come back as a [body, status] list with a 200
+        status = response.status_code
+        if response.body.startswith(b'[{"error"'):
+            status = json.loads(response.body)[1]
+        statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - started
+    peak_mb = None
+    if args.tracemalloc:
+        peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    return {
+        "requests": args.requests,
+        "throughput": args.requests / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1e3,
+        "p95_ms": percentile(latencies, 95) * 1e3,
+        "p99_ms": percentile(latencies, 99) * 1e3,
+        "peak_alloc_mb": peak_mb,
+        "max_rss_mb": max_rss_mb(),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def print_results(results, baseline=None):
+    print(f"  {'endpoint':<16} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'peak alloc':>11} {'max rss':>9}  statuses")
+    for name, result in results.items():
+        peak = f"{result['peak_alloc_mb']:8.1f}MB" if result['peak_alloc_mb'] is not None else f"{'-':>10}"
+        line = (f"  {name:<16} {result['throughput']:8.1f} {result['p50_ms']:7.1f}ms {result['p95_ms']:7.1f}ms"
+                f" {result['p99_ms']:7.1f}ms {peak:>11} {result['max_rss_mb']:7.1f}MB  "
+                + " ".join(f"{status}x{count}" for status, count in result['statuses'].items()))
+        print(line)
+        previous = (baseline or {}).get(name)
+        if previous:
+            change = lambda key: (result[key] / previous[key] - 1) * 100 if previous[key] else 0.0
+            print(f"  {'':<16} {change('throughput'):+7.0f}% {change('p50_ms'):+8.0f}% {change('p95_ms'):+8.0f}% {change('p99_ms'):+8.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--requests', type=int, default=50, help="requests per endpoint")
+    parser.add_argument('--unique', type=int, default=0, help="distinct inputs per endpoint, 0 makes every request distinct")
+    parser.add_argument('--categories', type=int, default=3)
+    parser.add_argument('--sources', type=int, default=4, help="feeds per category")
+    parser.add_argument('--entries', type=int, default=50, help="entries per feed")
+    parser.add_argument('--fresh-feeds', action='store_true', help="publish a new entry before every feeds request")
+    parser.add_argument('--paragraphs', type=int, default=12, help="paragraphs per article page and text")
+    parser.add_argument('--upstream-latency', type=float, default=0.02, help="seconds added by every stub and fake client")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of upstream calls that fail")
+    parser.add_argument('--verbose', action='store_true', help="show the app's info logs")
+    parser.add_argument('--tracemalloc', action='store_true', help="report peak Python allocations, slows the run down")
+    parser.add_argument('--save', help="write the results as JSON")
+    parser.add_argument('--compare', help="show changes against results saved with --save")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    workdir = tempfile.mkdtemp(prefix='intellifeed-bench-')
+    stubs = {
+        'rss': RssStub(entries=args.entries, latency=args.upstream_latency, error_rate=args.error_rate),
+        'articles': ArticleStub(paragraphs=args.paragraphs, latency=args.upstream_latency, error_rate=args.error_rate),
+        'inference': InferenceStub(latency=args.upstream_latency, error_rate=args.error_rate),
+    }
+    for stub in stubs.values():
+        stub.start()
+
+    # The app reads its configuration at import
+    os.environ.update({
+        'HF_INFERENCE_URL': stubs['inference'].models_url,
+        'INGEST_ENABLED': '0',
+        'ARTICLE_CACHE_DIR': os.path.join(workdir, 'articles'),
+        'AUDIO_CACHE_DIR': os.path.join(workdir, 'audio'),
+    })
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    import app
+    from chalice.test import Client
+    from chalicelib.registry import CategoryRegistry
+
+    categories_path = os.path.join(workdir, 'rss_feeds.json')
+    with open(categories_path, 'w') as f:
+        json.dump({
+            f"Bench{c}": [
+                {"source_name": f"Source {c}-{s}", "source_link": stubs['rss'].feed_url(f"c{c}s{s}")}
+                for s in range(args.sources)
+            ]
+            for c in range(args.categories)
+        }, f)
+    app.category_registry = CategoryRegistry(categories_path)
+    if args.fresh_feeds:
+        app.feed_cache.ttl = 0
+
+    fakes = {"latency": args.upstream_latency, "error_rate": args.error_rate}
+    app.polly_client = FakePolly(**fakes)
+    app.translate_client = FakeTranslate(**fakes)
+    app.sentiment_analyzer.client = FakeComprehend(**fakes)
+
+    texts = [make_text(variant, args.paragraphs) for variant in range(max(args.unique, 8))]
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    print(f"{args.requests} sequential requests per endpoint, {args.unique or 'all'} distinct inputs, "
+          f"upstream latency {args.upstream_latency * 1e3:.0f}ms, error rate {args.error_rate:.0%}")
+    with Client(app.app) as client:
+        for name in args.endpoints:
+            results[name] = run_endpoint(client, name, args, stubs, texts)
+    print_results(results, baseline)
+
+    for stub in stubs.values():
+        stub.stop()
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"Saved to {args.save}")
+
+
+if __name__ == '__main__':
+    main()
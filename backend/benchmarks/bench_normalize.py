@@ -0,0 +1,68 @@
+"""
+Micro-benchmark for feed text normalization.
+Compares the per-entry cost of chalicelib.normalize against the chained
+str.replace / re.sub cleaning it replaced.
+
+Run from the backend directory:
+    python -m benchmarks.bench_normalize
+"""
+import argparse
+import random
+import re
+import timeit
+
+from chalicelib import normalize
+
+
+def legacy_clean(text):
+    # The cleaning previously inlined in get_feeds and get_custom_feed
+    text = text.replace("&#8220;", "\"")
+    text = text.replace("&#8221;", "\"")
+    text = text.replace("&#8217;", "'")
+    text = text.replace("&#8230;", "...")
+    text = re.sub(r'\[\s*\.\.\.\s*\]$', '', text)
+    text = re.sub(r'<[^>]*?>', '', text)
+    return text
+
+
+def make_entries(count, seed=0):
+    """
+    Build (title, summary) pairs shaped like typical WordPress feed entries.
+    """
+    rng = random.Random(seed)
+    words = ["market", "election", "team", "season", "policy", "launch", "report", "city", "storm", "update"]
+    entries = []
+    for _ in range(count):
+        title = " ".join(rng.choice(words) for _ in range(8))
+        if rng.random() < 0.5:
+            title = f"&#8220;{title}&#8221; isn&#8217;t over"
+        body = " ".join(rng.choice(words) for _ in range(60))
+        summary = f"<p>{body} &amp; more <a href=\"https://example.com/{rng.randint(0, 9999)}\">read</a></p> [&#8230;]"
+        entries.append((title, summary))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=500, help="entries per simulated feed")
+    parser.add_argument('--repeat', type=int, default=20, help="number of timed runs, the best is reported")
+    args = parser.parse_args()
+
+    entries = make_entries(args.entries)
+    titles = [title for title, _ in entries]
+    summaries = [summary for _, summary in entries]
+
+    candidates = {
+        "legacy str.replace/re.sub": lambda: [(legacy_clean(t), legacy_clean(s)) for t, s in entries],
+        "normalize.clean_text": lambda: [(normalize.clean_text(t), normalize.clean_text(s)) for t, s in entries],
+        "normalize.clean_batch": lambda: (normalize.clean_batch(titles), normalize.clean_batch(summaries)),
+    }
+
+    print(f"{args.entries} entries, best of {args.repeat} runs")
+    for name, run in candidates.items():
+        best = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        print(f"  {name:<28} {best * 1e3:8.2f} ms/feed  {best / args.entries * 1e6:7.2f} us/entry")
+
+
+if __name__ == '__main__':
+    main()
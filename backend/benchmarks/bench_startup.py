@@ -0,0 +1,103 @@
+"""
+Cold start benchmark: import time of the app and time to first response per
+endpoint, each measured in a fresh interpreter like a new Lambda container.
+Also reports what the lazily loaded dependencies cost when a route first
+needs them. Endpoints that call out are pointed at a local inference stub,
+so no network or AWS credentials are needed.
+
+Run from the backend directory:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --max-import-ms 150   # fail on regression
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.stub_servers import InferenceStub
+
+ARTICLE = "The city council approved a new budget on Tuesday. " * 20
+
+ENDPOINTS = {
+    "GET /categories": ("GET", "/categories", None),
+    "POST /chat": ("POST", "/chat", {
+        "messages": [{"role": "user", "content": "What was approved?"}],
+        "article_text": ARTICLE,
+        "article_title": "Budget"
+    }),
+    "POST /sentiment-analysis (local)": ("POST", "/sentiment-analysis", {"text": ARTICLE, "engine": "local"}),
+}
+
+# Dependencies deferred to first use, with the expression that loads them
+DEFERRED = {
+    "boto3 client": "app.polly_client.get()",
+    "feedparser": "fetcher.feedparser.parse",
+    "newspaper + bs4": "extract.newspaper.Article, extract.bs4.BeautifulSoup",
+}
+
+_ENDPOINT_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+from chalice.test import Client
+method, path, body = json.loads({request!r})
+with Client(app.app) as client:
+    sent = time.perf_counter()
+    kwargs = {{"body": json.dumps(body), "headers": {{"content-type": "application/json"}}}} if body else {{}}
+    response = client.http.request(method, path, **kwargs)
+    answered = time.perf_counter()
+print(json.dumps({{"import": imported - started, "first_response": answered - sent, "status": response.status_code}}))
+"""
+
+_DEFERRED_SCRIPT = """
+import json, time
+import app
+from chalicelib import extract, fetcher
+started = time.perf_counter()
+{expression}
+print(json.dumps({{"load": time.perf_counter() - started}}))
+"""
+
+
+def run_script(script, env):
+    output = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help="fresh interpreters per measurement, the median is reported")
+    parser.add_argument('--max-import-ms', type=float, help="exit non-zero if importing the app takes longer")
+    args = parser.parse_args()
+
+    with InferenceStub() as stub:
+        env = dict(os.environ, HF_INFERENCE_URL=stub.models_url, INGEST_ENABLED='0')
+        env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.getcwd(), env.get('PYTHONPATH')]))
+
+        import_times = []
+        print(f"Median of {args.repeat} cold starts")
+        print(f"  {'endpoint':<34} {'import':>9} {'first response':>15}")
+        for name, request in ENDPOINTS.items():
+            runs = [run_script(_ENDPOINT_SCRIPT.format(request=json.dumps(request)), env) for _ in range(args.repeat)]
+            import_times.extend(run["import"] for run in runs)
+            statuses = {run["status"] for run in runs}
+            print(f"  {name:<34} {statistics.median(run['import'] for run in runs) * 1e3:7.1f}ms"
+                  f" {statistics.median(run['first_response'] for run in runs) * 1e3:13.1f}ms  status {','.join(map(str, sorted(statuses)))}")
+
+        print(f"  {'deferred dependency':<34} {'first use':>9}")
+        for name, expression in DEFERRED.items():
+            runs = [run_script(_DEFERRED_SCRIPT.format(expression=expression), env) for _ in range(args.repeat)]
+            print(f"  {name:<34} {statistics.median(run['load'] for run in runs) * 1e3:7.1f}ms")
+
+    import_ms = statistics.median(import_times) * 1e3
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"Importing the app took {import_ms:.1f}ms, over the {args.max_import_ms:.0f}ms budget")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+In-process stand-ins for the boto3 Polly, Translate and Comprehend clients,
+with injectable latency and error rates. They answer with the same response
+shapes as the real APIs, so the routes run unchanged.
+"""
+import io
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+
+class FakeClient:
+    """
+    Base for the fakes: every call sleeps latency plus per_kb for each KB
+    of input, error_rate of the calls raise a throttling ClientError.
+    """
+
+    def __init__(self, latency=0.02, per_kb=0.002, error_rate=0.0):
+        self.latency = latency
+        self.per_kb = per_kb
+        self.error_rate = error_rate
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self, operation, size):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency + self.per_kb * size / 1024)
+        if random.random() < self.error_rate:
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, operation)
+
+
+class FakePolly(FakeClient):
+    # Roughly what neural MP3 output weighs per character of text
+    BYTES_PER_CHAR = 160
+
+    def synthesize_speech(self, Text, OutputFormat='mp3', VoiceId='Joanna', **kwargs):
+        if len(Text) > 3000:
+            raise ClientError({"Error": {"Code": "TextLengthExceededException", "Message": "Text too long"}}, "SynthesizeSpeech")
+        self._call("SynthesizeSpeech", len(Text))
+        return {"AudioStream": io.BytesIO(b"\xff\xf3" * (len(Text) * self.BYTES_PER_CHAR // 2)), "ContentType": "audio/mpeg"}
+
+
+class FakeTranslate(FakeClient):
+    def translate_text(self, Text, SourceLanguageCode, TargetLanguageCode, **kwargs):
+        if len(Text.encode('utf-8')) > 10000:
+            raise ClientError({"Error": {"Code": "TextSizeLimitExceededException", "Message": "Text too long"}}, "TranslateText")
+        self._call("TranslateText", len(Text.encode('utf-8')))
+        return {
+            "TranslatedText": f"[{TargetLanguageCode}] {Text}",
+            "SourceLanguageCode": "en" if SourceLanguageCode == "auto" else SourceLanguageCode,
+            "TargetLanguageCode": TargetLanguageCode
+        }
+
+
+class FakeComprehend(FakeClient):
+    def batch_detect_sentiment(self, TextList, LanguageCode):
+        self._call("BatchDetectSentiment", sum(len(text) for text in TextList))
+        results = []
+        for index, text in enumerate(TextList):
+            rng = random.Random(text)
+            positive, negative = rng.random() * 0.6, rng.random() * 0.4
+            neutral = 1 - positive - negative
+            scores = {"Positive": positive, "Negative": negative, "Neutral": neutral, "Mixed": 0.0}
+            results.append({"Index": index, "Sentiment": max(scores, key=scores.get).upper(), "SentimentScore": scores})
+        return {"ResultList": results, "ErrorList": []}
+
+    def batch_detect_key_phrases(self, TextList, LanguageCode):
+        self._call("BatchDetectKeyPhrases", sum(len(text) for text in TextList))
+        results = []
+        for index, text in enumerate(TextList):
+            words = text.split()
+            phrases = [" ".join(words[i:i + 2]) for i in range(0, min(len(words), 40), 8)]
+            results.append({"Index": index, "KeyPhrases": [{"Text": phrase, "Score": 0.9} for phrase in phrases]})
+        return {"ResultList": results, "ErrorList": []}
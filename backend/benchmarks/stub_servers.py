@@ -0,0 +1,301 @@
+"""
+Local stand-ins for upstream services, for benchmarks and manual testing.
+
+Run the fake inference API and point the backend at it:
+    python -m benchmarks.stub_servers inference --port 8800 --latency 0.2 --error-rate 0.1
+    HF_INFERENCE_URL=http://127.0.0.1:8800/models chalice local
+
+Serve synthetic RSS feeds (http://127.0.0.1:8801/feeds/<name>) or article
+pages (http://127.0.0.1:8802/articles/<n>):
+    python -m benchmarks.stub_servers rss --port 8801 --entries 50
+    python -m benchmarks.stub_servers articles --port 8802 --paragraphs 12
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+WORDS = ("market election team season policy launch report city storm update council budget "
+         "minister player court study energy climate company shares research police border").split()
+FILLERS = "the of and to in that is for with was on as at by from said would have".split()
+
+
+class StubServer:
+    """
+    Threaded HTTP server running in the background, handler_class gets the
+    server's settings through self.server.stub.
+    """
+    handler_class = None
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), self.handler_class)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        self.requests = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _InferenceHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        stub = self.server.stub
+        stub.requests += 1
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        time.sleep(stub.latency)
+
+        if stub.loading_until and time.monotonic() < stub.loading_until:
+            return self._send(503, {"error": "Model is currently loading", "estimated_time": 1.0})
+        if random.random() < stub.error_rate:
+            return self._send(503, {"error": "Service Unavailable"})
+
+        question = payload.get("inputs", "")[-80:]
+        text = f"{stub.reply} ({len(payload.get('inputs', ''))} chars, ...{question!r})"
+        if payload.get("stream"):
+            return self._stream(text)
+        return self._send(200, [{"generated_text": text}])
+
+    def _stream(self, text):
+        # Server-sent events in the text-generation-inference format, one word per token
+        stub = self.server.stub
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        tokens = [word + " " for word in text.split(" ")]
+        try:
+            for i, token in enumerate(tokens):
+                time.sleep(stub.token_latency)
+                event = {"token": {"id": i, "text": token, "special": False}, "generated_text": None}
+                if i == len(tokens) - 1:
+                    event["generated_text"] = text
+                self.wfile.write(f"data:{json.dumps(event)}\n\n".encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, like on a stop phrase
+            pass
+
+
+class InferenceStub(StubServer):
+    """
+    Fake Hugging Face Inference API. Every model answers after latency
+    seconds, error_rate of the calls fail with a 503 and loading_for makes
+    the model report that it is loading for that many seconds after start.
+    Streamed calls send one token every token_latency seconds.
+    """
+    handler_class = _InferenceHandler
+
+    def __init__(self, latency=0.0, error_rate=0.0, loading_for=0.0, reply="Stub answer", token_latency=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.loading_until = time.monotonic() + loading_for if loading_for else 0.0
+        self.reply = reply
+
+    @property
+    def models_url(self):
+        # Value for HF_INFERENCE_URL
+        return f"{self.url}/models"
+
+
+def _sentence(rng, words=12):
+    # Function words between the nouns, extractors look for them to find body text
+    sentence = " ".join(f"{rng.choice(WORDS)} {rng.choice(FILLERS)}" for _ in range(words // 2))
+    return sentence.capitalize() + " " + rng.choice(WORDS) + "."
+
+
+class _StaticHandler(BaseHTTPRequestHandler):
+    """
+    Serves the documents built by the stub's render(path, query), with
+    ETag revalidation.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub.requests += 1
+        url = urlparse(self.path)
+        time.sleep(stub.latency)
+        if random.random() < stub.error_rate:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        document = stub.render(url.path, parse_qs(url.query))
+        if document is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        data = document.encode()
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', stub.content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class RssStub(StubServer):
+    """
+    Synthetic RSS 2.0 feeds at /feeds/<name>, entries per feed (or the
+    ?entries= query), newest first. Every feed name gets its own stable
+    content, so responses revalidate with 304s until the stub is refreshed.
+    """
+    handler_class = _StaticHandler
+    content_type = 'application/rss+xml; charset=utf-8'
+
+    def __init__(self, entries=50, latency=0.0, error_rate=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.entries = entries
+        self.latency = latency
+        self.error_rate = error_rate
+        self.generation = 0
+        self.started = int(time.time())
+
+    def feed_url(self, name):
+        return f"{self.url}/feeds/{name}"
+
+    def refresh(self):
+        """
+        Publish a new entry in every feed, so the next fetch sees a change.
+        """
+        self.generation += 1
+
+    def render(self, path, query):
+        if not path.startswith('/feeds/'):
+            return None
+        name = path[len('/feeds/'):]
+        entries = int(query.get('entries', [self.entries])[0])
+        items = []
+        # Newest first, one entry every ten minutes
+        for number in range(self.generation + entries - 1, self.generation - 1, -1):
+            rng = random.Random(f"{name}-{number}")
+            published = formatdate(self.started + (number - entries) * 600, usegmt=True)
+            items.append(
+                f"<item><title>{_sentence(rng, 8)} &#8220;{name} {number}&#8221;</title>"
+                f"<link>http://news.example.com/{name}/{number}?utm_source=rss</link><guid>{name}-{number}</guid>"
+                f"<description>&lt;p&gt;{_sentence(rng, 40)} &amp; {_sentence(rng, 20)}&lt;/p&gt; [&#8230;]</description>"
+                f"<pubDate>{published}</pubDate></item>"
+            )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+            f"<title>Stub feed {name}</title><link>http://news.example.com/{name}</link>"
+            f"<description>Synthetic feed</description>{''.join(items)}</channel></rss>"
+        )
+
+
+class ArticleStub(StubServer):
+    """
+    Synthetic news article pages at /articles/<n>, each with paragraphs of
+    body text inside the usual page chrome.
+    """
+    handler_class = _StaticHandler
+    content_type = 'text/html; charset=utf-8'
+
+    def __init__(self, paragraphs=12, latency=0.0, error_rate=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.paragraphs = paragraphs
+        self.latency = latency
+        self.error_rate = error_rate
+
+    def article_url(self, number):
+        return f"{self.url}/articles/{number}"
+
+    def render(self, path, query):
+        if not path.startswith('/articles/'):
+            return None
+        number = path[len('/articles/'):]
+        rng = random.Random(number)
+        body = "".join(f"<p>{' '.join(_sentence(rng) for _ in range(5))}</p>" for _ in range(self.paragraphs))
+        return (
+            f"<html><head><title>Story {number}</title>"
+            f'<meta property="og:title" content="Story {number}"></head><body>'
+            '<nav><a href="/">Home</a> <a href="/world">World</a></nav>'
+            f"<article><h1>Story {number}</h1><p class=\"byline\">By Stub Reporter</p>{body}</article>"
+            "<footer>Copyright Stub News</footer></body></html>"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='service', required=True)
+    inference = subparsers.add_parser('inference', help="fake Hugging Face Inference API")
+    inference.add_argument('--port', type=int, default=8800)
+    inference.add_argument('--latency', type=float, default=0.0)
+    inference.add_argument('--error-rate', type=float, default=0.0)
+    inference.add_argument('--loading-for', type=float, default=0.0)
+    inference.add_argument('--token-latency', type=float, default=0.0)
+    rss = subparsers.add_parser('rss', help="synthetic RSS feeds")
+    rss.add_argument('--port', type=int, default=8801)
+    rss.add_argument('--entries', type=int, default=50)
+    rss.add_argument('--latency', type=float, default=0.0)
+    rss.add_argument('--error-rate', type=float, default=0.0)
+    articles = subparsers.add_parser('articles', help="synthetic article pages")
+    articles.add_argument('--port', type=int, default=8802)
+    articles.add_argument('--paragraphs', type=int, default=12)
+    articles.add_argument('--latency', type=float, default=0.0)
+    articles.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.service == 'inference':
+        stub = InferenceStub(latency=args.latency, error_rate=args.error_rate, loading_for=args.loading_for,
+                             token_latency=args.token_latency, port=args.port)
+        print(f"Inference stub listening, set HF_INFERENCE_URL={stub.models_url}")
+    elif args.service == 'rss':
+        stub = RssStub(entries=args.entries, latency=args.latency, error_rate=args.error_rate, port=args.port)
+        print(f"RSS stub listening, feeds at {stub.feed_url('<name>')}")
+    else:
+        stub = ArticleStub(paragraphs=args.paragraphs, latency=args.latency, error_rate=args.error_rate, port=args.port)
+        print(f"Article stub listening, pages at {stub.article_url('<n>')}")
+    try:
+        stub.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Two-tier cache of /article extraction results keyed by normalized URL.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from chalicelib.identity import normalize_url
+
+log = logging.getLogger(__name__)
+
+ARTICLE_CACHE_TTL = float(os.getenv('ARTICLE_CACHE_TTL', str(24 * 3600)))
+ARTICLE_CACHE_MEMORY_ENTRIES = int(os.getenv('ARTICLE_CACHE_MEMORY_ENTRIES', '256'))
+# /tmp is the only writable path on Lambda
+ARTICLE_CACHE_DIR = os.getenv('ARTICLE_CACHE_DIR', '/tmp/intellifeed/articles')
+ARTICLE_CACHE_MAX_BYTES = int(os.getenv('ARTICLE_CACHE_MAX_BYTES', str(100 * 1024 * 1024)))
+
+
+class ArticleCache:
+    """
+    In-memory LRU in front of an on-disk tier of JSON files.
+    Both tiers honour a TTL, the memory tier is bounded by entry count and
+    the disk tier by total bytes, evicting the oldest files first.
+    """
+
+    def __init__(self, directory=ARTICLE_CACHE_DIR, ttl=ARTICLE_CACHE_TTL,
+                 memory_entries=ARTICLE_CACHE_MEMORY_ENTRIES, max_bytes=ARTICLE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+    def get(self, url):
+        """
+        Return the cached response for a URL, or None.
+        """
+        key = self.key(url)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry["expires_at"] > now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return entry["response"]
+                del self._memory[key]
+
+        entry = self._read_disk(key)
+        if entry is not None and entry["expires_at"] > now:
+            with self._lock:
+                self._remember(key, entry)
+                self.stats["disk_hits"] += 1
+            return entry["response"]
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, url, response, ttl=None):
+        """
+        Store a response in both tiers.
+        """
+        key = self.key(url)
+        entry = {"expires_at": time.time() + (self.ttl if ttl is None else ttl), "response": response}
+        with self._lock:
+            self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_disk(self, key):
+        try:
+            with open(self._path(key), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.warning(f"Unreadable article cache entry {key}: {e}")
+            return None
+
+    def _write_disk(self, key, entry):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            data = json.dumps(entry).encode()
+            path = self._path(key)
+            # Write to a temporary file first so readers never see a partial entry
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            with self._lock:
+                if self._disk_bytes is None:
+                    self._disk_bytes = self._scan_disk_bytes()
+                try:
+                    self._disk_bytes -= os.path.getsize(path)
+                except OSError:
+                    pass
+                os.replace(tmp_path, path)
+                self._disk_bytes += len(data)
+                if self._disk_bytes > self.max_bytes:
+                    self._evict_disk()
+        except OSError as e:
+            log.warning(f"Could not write article cache entry {key}: {e}")
+
+    def _scan_disk_bytes(self):
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith('.json'):
+                    total += entry.stat().st_size
+        return total
+
+    def _evict_disk(self):
+        # Drop expired files first, then the oldest ones until under budget
+        with os.scandir(self.directory) as entries:
+            files = sorted(
+                (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                for entry in entries if entry.name.endswith('.json')
+            )
+        now = time.time()
+        for mtime, size, path in files:
+            if self._disk_bytes <= self.max_bytes * 0.9 and mtime + self.ttl > now:
+                break
+            try:
+                os.remove(path)
+                self._disk_bytes -= size
+            except OSError:
+                pass
@@ -0,0 +1,98 @@
+"""
+Conversion of parsed feed entries into the article dicts served by the API.
+"""
+import calendar
+import time
+
+from chalicelib import metrics, normalize
+from chalicelib.identity import article_id
+
+
+def published_timestamp(entry):
+    """
+    Epoch seconds of an entry's publish (or update) date, parsed once at
+    ingestion so articles can be ordered without parsing date strings again.
+    """
+    parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+    return calendar.timegm(parsed) if parsed else None
+
+
+def articles_from_feed(feed, category, source):
+    """
+    Build the article dicts for every entry of a parsed category source.
+    """
+    entries = feed.entries
+    with metrics.span('feed_clean'):
+        titles = normalize.clean_batch([entry.title for entry in entries])
+        summaries = normalize.clean_batch([getattr(entry, 'summary', None) for entry in entries])
+
+    articles = []
+    for entry, title, summary in zip(entries, titles, summaries):
+        articles.append({
+            "id": article_id(entry.link, getattr(entry, 'id', None)),
+            "category": category,
+            "source_name": source["source_name"],
+            "title": title,
+            "link": entry.link,
+            "summary": summary + "..." if summary else summary,
+            "published": entry.published if hasattr(entry, 'published') else None,
+            "published_ts": published_timestamp(entry)
+        })
+    return articles
+
+
+def custom_articles_from_feed(feed, feed_title):
+    """
+    Build the article dicts for a user supplied feed, which may be missing
+    fields that the configured sources always have.
+    """
+    entries = feed.entries
+
+    # Extract summary - try different fields as feeds vary
+    raw_summaries = []
+    for entry in entries:
+        summary = None
+        if hasattr(entry, 'summary'):
+            summary = entry.summary
+        elif hasattr(entry, 'description'):
+            summary = entry.description
+        elif hasattr(entry, 'content') and entry.content:
+            summary = entry.content[0].value if hasattr(entry.content[0], 'value') else str(entry.content[0])
+        # If still no summary, use a placeholder
+        raw_summaries.append(summary or "No summary available.")
+
+    with metrics.span('feed_clean'):
+        titles = normalize.clean_batch([getattr(entry, 'title', "Untitled") for entry in entries])
+        summaries = normalize.clean_batch(raw_summaries)
+
+    articles = []
+    for entry, title, summary in zip(entries, titles, summaries):
+        if len(summary) > 300:
+            summary = summary[:297] + "..."
+        elif not summary.endswith("..."):
+            summary += "..."
+
+        # Handle publication date
+        published_ts = published_timestamp(entry)
+        if hasattr(entry, 'published'):
+            published = entry.published
+        elif hasattr(entry, 'updated'):
+            published = entry.updated
+        elif hasattr(entry, 'pubDate'):
+            published = entry.pubDate
+        else:
+            # Use current time if no date available
+            published = time.strftime("%a, %d %b %Y %H:%M:%S %z", time.localtime())
+            published_ts = int(time.time())
+
+        articles.append({
+            "id": article_id(getattr(entry, 'link', None), getattr(entry, 'id', None), title),
+            "category": "Custom",
+            "source_name": feed_title,
+            "title": title,
+            "link": entry.link if hasattr(entry, 'link') else "#",
+            "summary": summary,
+            "published": published,
+            "published_ts": published_ts
+        })
+    return articles
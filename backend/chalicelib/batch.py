@@ -0,0 +1,105 @@
+"""
+Batch article extraction: pages are downloaded concurrently on threads and
+parsed on a process pool, so the CPU-bound parsing runs on every core.
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from chalicelib import extract
+
+log = logging.getLogger(__name__)
+
+BATCH_MAX_URLS = int(os.getenv('BATCH_MAX_URLS', '50'))
+BATCH_FETCH_WORKERS = int(os.getenv('BATCH_FETCH_WORKERS', '16'))
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', str(os.cpu_count() or 1)))
+
+_parse_pool = None
+
+
+def get_parse_pool():
+    """
+    Shared pool for parsing. Lambda has no /dev/shm, so process pools can't
+    be created there and parsing falls back to threads.
+    """
+    global _parse_pool
+    if _parse_pool is None:
+        try:
+            _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        except (OSError, NotImplementedError) as e:
+            log.warning(f"Process pool unavailable, parsing on threads: {e}")
+            _parse_pool = ThreadPoolExecutor(max_workers=PARSE_WORKERS)
+    return _parse_pool
+
+
+def reset_parse_pool():
+    """
+    Drop a broken pool, the next batch creates a new one.
+    """
+    global _parse_pool
+    _parse_pool = None
+
+
+def parse_in_worker(url, html):
+    """
+    Process pool entry point, returns (result, timings) or (None, error message).
+    """
+    timings = {}
+    try:
+        return extract.parse_html(url, html, timings), timings
+    except extract.ExtractionError as e:
+        return None, str(e)
+
+
+def iter_extract(urls, cache=None, fallback_ttl=None):
+    """
+    Extract many articles and yield (index, url, result, error) as each finishes.
+    Cached articles are yielded first, successful extractions are stored in
+    the cache, fallback extractions with fallback_ttl.
+    """
+    pending = []
+    for index, url in enumerate(urls):
+        cached = cache.get(url) if cache is not None else None
+        if cached is not None:
+            yield index, url, {**cached, "url": url}, None
+        else:
+            pending.append((index, url))
+    if not pending:
+        return
+
+    parse_pool = get_parse_pool()
+    with ThreadPoolExecutor(max_workers=min(BATCH_FETCH_WORKERS, len(pending))) as fetch_pool:
+        fetches = {fetch_pool.submit(extract.fetch_html, url): (index, url) for index, url in pending}
+        parses = {}
+        # Hand each page to the parse pool as soon as its download finishes
+        for future in as_completed(fetches):
+            index, url = fetches[future]
+            try:
+                html = future.result()
+            except Exception as e:
+                yield index, url, None, f"fetch: {e}"
+                continue
+            try:
+                parses[parse_pool.submit(parse_in_worker, url, html)] = (index, url, html)
+            except BrokenProcessPool:
+                reset_parse_pool()
+                parses[fetch_pool.submit(parse_in_worker, url, html)] = (index, url, html)
+
+    for future in as_completed(parses):
+        index, url, html = parses[future]
+        try:
+            result, detail = future.result()
+        except BrokenProcessPool:
+            # A crashed worker takes the pool down, parse this one in-process
+            reset_parse_pool()
+            result, detail = parse_in_worker(url, html)
+        if result is None:
+            yield index, url, None, detail
+            continue
+        # Metrics recorded in a worker process would be lost, record them here
+        extract.record_timings(detail)
+        if cache is not None:
+            cache.put(url, result, ttl=fallback_ttl if result.get("fallback") else None)
+        yield index, url, result, None
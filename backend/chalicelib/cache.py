@@ -0,0 +1,195 @@
+"""
+Bounded TTL caches with byte accounting, LRU eviction and hit-rate counters.
+The storage is pluggable: an in-process backend, or a SQLite file that
+several local worker processes can share.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+
+def json_size(value):
+    """
+    Approximate memory cost of a JSON-serializable value.
+    """
+    return len(json.dumps(value, separators=(',', ':')))
+
+
+class MemoryBackend:
+    """
+    In-process LRU store bounded by a byte budget.
+    """
+
+    def __init__(self, max_bytes, sizeof=json_size):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()   # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        """
+        Return (found, expired, value).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, False, None
+            if entry[0] <= now:
+                del self._entries[key]
+                self._bytes -= entry[1]
+                return False, True, None
+            self._entries.move_to_end(key)
+            return True, False, entry[2]
+
+    def set(self, key, value, expires_at):
+        """
+        Store a value and return how many entries were evicted to make room.
+        """
+        size = self.sizeof(value)
+        evicted = 0
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            if size > self.max_bytes:
+                return evicted
+            self._entries[key] = (expires_at, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                evicted += 1
+        return evicted
+
+    def usage(self):
+        return {"entries": len(self._entries), "bytes": self._bytes}
+
+
+class SQLiteBackend:
+    """
+    Store in a local SQLite file, shared by every worker process on the host.
+    Values must be JSON-serializable.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+
+    def _connect(self):
+        # sqlite3 connections can't be shared across threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=5)
+        return db
+
+    def get(self, key, now):
+        db = self._connect()
+        with db:
+            row = db.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False, False, None
+            if row[1] <= now:
+                db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return False, True, None
+            db.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return True, False, json.loads(row[0])
+
+    def set(self, key, value, expires_at):
+        data = json.dumps(value, separators=(',', ':'))
+        if len(data) > self.max_bytes:
+            return 0
+        db = self._connect()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), expires_at, time.time())
+            )
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            # Evict least recently used rows until back under budget
+            evicted = 0
+            for row_key, size in db.execute("SELECT key, size FROM cache ORDER BY accessed_at").fetchall():
+                if total <= self.max_bytes:
+                    break
+                db.execute("DELETE FROM cache WHERE key = ?", (row_key,))
+                total -= size
+                evicted += 1
+            return evicted
+
+    def usage(self):
+        entries, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return {"entries": entries, "bytes": size}
+
+
+class TTLCache:
+    """
+    Cache front end: per-entry TTL on top of a backend, plus counters.
+    """
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self._counters = {"hits": 0, "misses": 0, "expirations": 0, "evictions": 0, "sets": 0}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        try:
+            found, expired, value = self.backend.get(key, time.time())
+        except sqlite3.Error as e:
+            log.warning(f"Cache read failed: {e}")
+            found, expired, value = False, False, None
+        with self._lock:
+            self._counters["hits" if found else "misses"] += 1
+            if expired:
+                self._counters["expirations"] += 1
+        return value if found else default
+
+    def set(self, key, value, ttl=None):
+        try:
+            evicted = self.backend.set(key, value, time.time() + (self.ttl if ttl is None else ttl))
+        except sqlite3.Error as e:
+            log.warning(f"Cache write failed: {e}")
+            return
+        with self._lock:
+            self._counters["sets"] += 1
+            self._counters["evictions"] += evicted
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = counters["hits"] / lookups if lookups else 0.0
+        counters.update(self.backend.usage())
+        return counters
+
+
+def create_cache(backend, ttl, max_bytes, path=None):
+    """
+    Build a TTLCache from configuration, backend is "memory" or "sqlite".
+    """
+    if backend == 'sqlite':
+        try:
+            return TTLCache(SQLiteBackend(path, max_bytes), ttl)
+        except (OSError, sqlite3.Error) as e:
+            log.warning(f"Could not open shared cache at {path}, using memory: {e}")
+    return TTLCache(MemoryBackend(max_bytes), ttl)
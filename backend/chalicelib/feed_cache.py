@@ -0,0 +1,113 @@
+"""
+URL-keyed cache of parsed RSS feeds with HTTP conditional revalidation.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from chalicelib import fetcher, metrics
+from chalicelib.lazy import lazy_import
+
+feedparser = lazy_import('feedparser')
+
+log = logging.getLogger(__name__)
+
+# How long a parsed feed is served without asking the upstream again (seconds)
+FEED_CACHE_TTL = float(os.getenv('FEED_CACHE_TTL', '300'))
+# Size bounds, the byte budget is measured on the raw feed documents
+FEED_CACHE_MAX_ENTRIES = int(os.getenv('FEED_CACHE_MAX_ENTRIES', '256'))
+FEED_CACHE_MAX_BYTES = int(os.getenv('FEED_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+
+
+class CachedFeed:
+    """
+    A parsed feed together with the validators needed to revalidate it.
+    """
+    __slots__ = ('feed', 'etag', 'last_modified', 'fetched_at', 'size')
+
+    def __init__(self, feed, etag, last_modified, fetched_at, size):
+        self.feed = feed
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.size = size
+
+
+class FeedCache:
+    """
+    LRU cache of parsed feeds keyed by feed URL.
+    Fresh entries are returned without any network I/O, stale entries are
+    revalidated with If-None-Match / If-Modified-Since so an unchanged feed
+    only costs a 304 round trip and no parsing.
+    """
+
+    def __init__(self, ttl=FEED_CACHE_TTL, max_entries=FEED_CACHE_MAX_ENTRIES, max_bytes=FEED_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "evictions": 0}
+
+    def fetch(self, url, timeout=fetcher.SOURCE_TIMEOUT, max_age=None):
+        """
+        Return the parsed feed for a URL, downloading it only when needed.
+        Has the same signature as fetcher.fetch_feed so it can be passed to iter_fetch.
+        max_age overrides the TTL, 0 always revalidates with the upstream.
+        """
+        max_age = self.ttl if max_age is None else max_age
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(url)
+            if cached is not None:
+                self._entries.move_to_end(url)
+                if now - cached.fetched_at < max_age:
+                    self.stats["hits"] += 1
+                    return cached.feed
+
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        response, body = fetcher.download(url, timeout=timeout, headers=headers)
+
+        if response.status_code == 304 and cached is not None:
+            with self._lock:
+                cached.fetched_at = time.monotonic()
+                self.stats["revalidated"] += 1
+            return cached.feed
+
+        response.raise_for_status()
+        with metrics.span('feed_parse'):
+            feed = feedparser.parse(body)
+        with self._lock:
+            self.stats["misses"] += 1
+        # Don't keep documents that aren't feeds, the next request should retry
+        if not (feed.bozo and not feed.entries):
+            self._store(url, CachedFeed(
+                feed,
+                response.headers.get('ETag'),
+                response.headers.get('Last-Modified'),
+                time.monotonic(),
+                len(body)
+            ))
+        return feed
+
+    def _store(self, url, cached):
+        with self._lock:
+            previous = self._entries.pop(url, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[url] = cached
+            self._bytes += cached.size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                evicted_url, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.stats["evictions"] += 1
+                log.debug(f"Evicted feed {evicted_url} from cache")
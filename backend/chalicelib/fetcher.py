@@ -0,0 +1,99 @@
+"""
+Concurrent fetching of RSS sources for the feed endpoints.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from chalicelib import metrics
+from chalicelib.lazy import lazy_import
+
+feedparser = lazy_import('feedparser')
+requests = lazy_import('requests')
+
+log = logging.getLogger(__name__)
+
+# Browser-like headers, some feeds reject the default python user agent
+FEED_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'application/rss+xml, application/xml, text/xml, */*'
+}
+
+# Limits for a category fetch, all in seconds
+SOURCE_TIMEOUT = float(os.getenv('FEED_SOURCE_TIMEOUT', '8'))
+FETCH_DEADLINE = float(os.getenv('FEED_FETCH_DEADLINE', '12'))
+MAX_WORKERS = int(os.getenv('FEED_FETCH_WORKERS', '8'))
+
+
+class FetchTimeout(TimeoutError):
+    """
+    Raised when a single source takes longer than its timeout.
+    """
+
+
+def download(url, timeout=SOURCE_TIMEOUT, headers=None):
+    """
+    Download a URL with a limit on the total transfer time.
+    The requests timeout only applies per socket read, so a slow-dripping
+    server could otherwise hold the worker forever.
+    Returns the response and its body.
+    """
+    started = time.monotonic()
+    with metrics.upstream('feed') as call:
+        response = requests.get(url, headers={**FEED_HEADERS, **(headers or {})}, timeout=timeout, stream=True)
+        try:
+            if response.status_code >= 400:
+                call.fail()
+            chunks = []
+            for chunk in response.iter_content(chunk_size=16384):
+                chunks.append(chunk)
+                if time.monotonic() - started > timeout:
+                    raise FetchTimeout(f"Timed out after {timeout}s")
+            return response, b''.join(chunks)
+        finally:
+            response.close()
+
+
+def fetch_feed(url, timeout=SOURCE_TIMEOUT):
+    """
+    Download and parse a single RSS feed.
+    """
+    response, body = download(url, timeout=timeout)
+    response.raise_for_status()
+    with metrics.span('feed_parse'):
+        return feedparser.parse(body)
+
+
+def describe_error(error):
+    """
+    Classify a fetch error for the failed_sources part of a response.
+    """
+    if isinstance(error, (TimeoutError, requests.Timeout)):
+        return "timeout"
+    return "error"
+
+
+def iter_fetch(sources, fetch=fetch_feed, timeout=SOURCE_TIMEOUT, deadline=FETCH_DEADLINE, max_workers=MAX_WORKERS):
+    """
+    Fetch sources concurrently and yield (source, result, error) as each one finishes.
+    Sources still running when the deadline passes are yielded last with a
+    FetchTimeout error and left to finish in the background.
+    """
+    if not sources:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sources))))
+    futures = {executor.submit(fetch, source["source_link"], timeout): source for source in sources}
+    finished = set()
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            finished.add(future)
+            error = future.exception()
+            yield futures[future], (None if error else future.result()), error
+    except TimeoutError:
+        for future, source in futures.items():
+            if future not in finished:
+                yield source, None, FetchTimeout(f"Deadline of {deadline}s exceeded")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
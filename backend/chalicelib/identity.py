@@ -0,0 +1,103 @@
+"""
+Stable article identity: URL normalization, content-addressed IDs and a
+deduplication index across sources and categories.
+"""
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only carry tracking information
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', 'cmpid', 'ref', 'ref_src', 'smid', 'ocid'}
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+DEDUP_INDEX_MAX_ENTRIES = int(os.getenv('DEDUP_INDEX_MAX_ENTRIES', '50000'))
+
+
+def normalize_url(url):
+    """
+    Canonical form of an article URL, used as identity and cache key.
+    Scheme and host are lowercased, http and https are treated alike, default
+    ports, fragments, tracking parameters and trailing slashes are dropped and
+    the remaining query parameters are sorted.
+    """
+    if not url:
+        return url
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    if parts.scheme.lower() not in DEFAULT_PORTS:
+        return url
+
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if port and port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{port}"
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    )
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit(('https', host, path, urlencode(query), ''))
+
+
+def article_id(link, guid=None, title=None):
+    """
+    Deterministic article ID, the same story gets the same ID on every request
+    and in every source that links to it. The normalized link is preferred,
+    the feed GUID and then the title are used for entries without a usable link.
+    """
+    link = normalize_url(link) if link and link != '#' else None
+    key = link or (f"guid:{guid}" if guid else f"title:{title or ''}")
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
+class DedupIndex:
+    """
+    Maps article IDs to the first article seen with that ID. Bounded, least
+    recently seen IDs are forgotten first.
+    """
+
+    def __init__(self, max_entries=DEDUP_INDEX_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, article):
+        """
+        Record an article and return the canonical article for its ID.
+        """
+        with self._lock:
+            canonical = self._entries.get(article["id"])
+            if canonical is None:
+                canonical = self._entries[article["id"]] = article
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(article["id"])
+            return canonical
+
+    def lookup(self, article_id):
+        """
+        Return the canonical article for an ID, or None if it isn't known.
+        """
+        return self._entries.get(article_id)
+
+
+def dedupe(articles):
+    """
+    Drop later articles with an ID that was already seen, keeping order.
+    """
+    seen = set()
+    unique = []
+    for article in articles:
+        if article["id"] not in seen:
+            seen.add(article["id"])
+            unique.append(article)
+    return unique
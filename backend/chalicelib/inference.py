@@ -0,0 +1,187 @@
+"""
+Client for the Hugging Face Inference API with pooled connections,
+deadline-bounded retries and a circuit breaker.
+"""
+import json
+import logging
+import os
+
+from chalicelib import metrics
+from chalicelib.lazy import lazy_import
+from chalicelib.resilience import CircuitBreaker, Deadline, backoff_delay
+
+requests = lazy_import('requests')
+
+log = logging.getLogger(__name__)
+
+# Point this at a local stub server to run without the real API
+HF_INFERENCE_URL = os.getenv('HF_INFERENCE_URL', 'https://api-inference.huggingface.co/models')
+# Upper bound on the time one generation may hold a worker, retries included
+HF_DEADLINE = float(os.getenv('HF_DEADLINE', '25'))
+HF_ATTEMPT_TIMEOUT = float(os.getenv('HF_ATTEMPT_TIMEOUT', '20'))
+HF_MAX_ATTEMPTS = int(os.getenv('HF_MAX_ATTEMPTS', '3'))
+
+
+class InferenceError(Exception):
+    """
+    Raised when the inference API could not produce a result.
+    """
+
+
+class InferenceClient:
+    """
+    Calls the inference API over a keep-alive session.
+    Retries use jittered backoff but never run past the call's deadline, and
+    the circuit breaker fails calls immediately while the API is unhealthy.
+    """
+
+    def __init__(self, api_key, base_url=HF_INFERENCE_URL, deadline=HF_DEADLINE,
+                 attempt_timeout=HF_ATTEMPT_TIMEOUT, max_attempts=HF_MAX_ATTEMPTS, breaker=None):
+        self.base_url = base_url.rstrip('/')
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.breaker = breaker or CircuitBreaker('Hugging Face Inference API')
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+    def generate(self, model, payload, deadline=None):
+        """
+        POST a payload to a model and return the decoded JSON result.
+        Raises CircuitOpenError without calling the API while the circuit is open.
+        """
+        response = self._post(model, payload, Deadline(deadline or self.deadline))
+        try:
+            return response.json()
+        except ValueError as e:
+            raise InferenceError(f"Invalid response from API: {e}")
+
+    def stream(self, model, payload, deadline=None):
+        """
+        Yield the generated text piece by piece as the model produces it.
+        Models that can't stream answer with plain JSON, their whole text is
+        yielded at once. Retries only happen before the first piece, closing
+        the generator early closes the connection and stops the generation.
+        """
+        deadline = Deadline(deadline or self.deadline)
+        response = self._post(model, dict(payload, stream=True), deadline, stream=True)
+        try:
+            if not response.headers.get('Content-Type', '').startswith('text/event-stream'):
+                try:
+                    yield generated_text(response.json())
+                except ValueError as e:
+                    raise InferenceError(f"Invalid response from API: {e}")
+                return
+
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                try:
+                    event = json.loads(line[len('data:'):])
+                except ValueError:
+                    continue
+                if event.get('error'):
+                    raise InferenceError(f"Generation failed: {event['error']}")
+                token = event.get('token') or {}
+                if token.get('text') and not token.get('special'):
+                    yield token['text']
+                if deadline.remaining() <= 0:
+                    raise InferenceError("Deadline passed while streaming")
+        except requests.RequestException as e:
+            raise InferenceError(f"Stream interrupted: {e}")
+        finally:
+            response.close()
+
+    def _post(self, model, payload, deadline, stream=False):
+        """
+        POST with retries until the API answers, return the 200 response.
+        """
+        self.breaker.check()
+        try:
+            response = self._send(model, payload, deadline, stream)
+        except BaseException:
+            # Whatever went wrong, the half-open trial must not stay taken
+            self.breaker.record_failure()
+            raise
+
+        # The API answered, client errors won't get better by retrying
+        self.breaker.record_success()
+        if response.status_code != 200:
+            log.error(f"Hugging Face API error: {response.status_code}")
+            response.close()
+            raise InferenceError(f"API returned status code {response.status_code}")
+        return response
+
+    def _send(self, model, payload, deadline, stream):
+        """
+        The attempts of _post, return the first response that isn't worth
+        retrying.
+        """
+        last_error = None
+
+        for attempt in range(self.max_attempts):
+            timeout = min(self.attempt_timeout, deadline.remaining())
+            if timeout <= 0:
+                break
+            if attempt:
+                metrics.inc('upstream_retries_total', upstream='inference')
+            try:
+                with metrics.upstream('inference') as call:
+                    response = self.session.post(f"{self.base_url}/{model}", json=payload, timeout=timeout, stream=stream)
+                    if response.status_code != 200:
+                        call.fail()
+            except requests.RequestException as e:
+                log.warning(f"Attempt {attempt + 1} for {model} failed: {e}")
+                last_error = e
+                if attempt == self.max_attempts - 1 or not deadline.sleep(backoff_delay(attempt)):
+                    break
+                continue
+
+            if response.status_code == 503:
+                # The API reports how long a cold model needs to load
+                wait_time = backoff_delay(attempt)
+                if "currently loading" in response.text.lower():
+                    try:
+                        wait_time = min(float(response.json().get("estimated_time", wait_time)), 10.0)
+                    except ValueError:
+                        pass
+                    log.info(f"Model {model} is still loading. Waiting {wait_time:.1f}s...")
+                else:
+                    log.warning(f"Attempt {attempt + 1} for {model} failed: Service unavailable (503)")
+                last_error = InferenceError("Hugging Face service is currently unavailable")
+                if attempt == self.max_attempts - 1 or not deadline.sleep(wait_time):
+                    break
+                continue
+
+            if response.status_code >= 500 or response.status_code == 429:
+                log.warning(f"Attempt {attempt + 1} for {model} failed: status code {response.status_code}")
+                response.close()
+                last_error = InferenceError(f"API returned status code {response.status_code}")
+                if attempt == self.max_attempts - 1 or not deadline.sleep(backoff_delay(attempt)):
+                    break
+                continue
+
+            return response
+
+        raise InferenceError(f"All retry attempts failed: {last_error}")
+
+
+def generated_text(result):
+    """
+    Extract the generated text from a JSON result, models answer in
+    slightly different shapes.
+    """
+    if isinstance(result, list) and len(result) > 0:
+        if isinstance(result[0], dict) and "generated_text" in result[0]:
+            return result[0]["generated_text"]
+        return str(result[0])
+    if isinstance(result, dict) and "generated_text" in result:
+        return result["generated_text"]
+    # For T5 models, the result might be just the text
+    return str(result)
@@ -0,0 +1,294 @@
+"""
+Background ingestion of the configured RSS sources into an in-memory article store.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+from chalicelib import fetcher
+from chalicelib.identity import dedupe
+from chalicelib.pagination import sort_key
+
+log = logging.getLogger(__name__)
+
+INGEST_ENABLED = os.getenv('INGEST_ENABLED', '1') == '1'
+# Polling intervals in seconds, each feed moves between the bounds on its own
+INGEST_MIN_INTERVAL = float(os.getenv('INGEST_MIN_INTERVAL', '60'))
+INGEST_MAX_INTERVAL = float(os.getenv('INGEST_MAX_INTERVAL', '1800'))
+INGEST_INITIAL_INTERVAL = float(os.getenv('INGEST_INITIAL_INTERVAL', '300'))
+
+
+class ArticleStore:
+    """
+    Category-indexed store holding the latest articles of every source.
+    Articles are registered in the optional DedupIndex and SearchIndex as
+    they arrive, and each source's list is also kept ordered newest first
+    for timelines.
+    """
+
+    def __init__(self, index=None, search=None):
+        self.index = index
+        self.search = search
+        self._articles = {}   # category -> {source_link: [article, ...]}
+        self._sorted = {}     # category -> {source_link: [article, ...] by sort_key}
+        self._failures = {}   # category -> {source_link: failure}
+        self._ready = set()
+        self._lock = threading.Lock()
+
+    def put(self, category, source, articles):
+        if self.index is not None:
+            for article in articles:
+                self.index.register(article)
+        if self.search is not None:
+            self.search.add_many(articles)
+        # Sorted once per poll, published_ts was parsed when the articles were built
+        ordered = sorted(articles, key=sort_key)
+        with self._lock:
+            self._articles.setdefault(category, {})[source["source_link"]] = articles
+            self._sorted.setdefault(category, {})[source["source_link"]] = ordered
+            self._failures.get(category, {}).pop(source["source_link"], None)
+
+    def fail(self, category, source, failure):
+        with self._lock:
+            self._failures.setdefault(category, {})[source["source_link"]] = failure
+
+    def mark_ready(self, category):
+        with self._lock:
+            self._ready.add(category)
+
+    def has(self, category):
+        """
+        Whether every source of the category has been polled at least once.
+        """
+        return category in self._ready
+
+    def read(self, category, sources):
+        """
+        Return (articles, failed_sources) for a category, in the configured source order.
+        Sources whose last poll failed keep serving their previous articles,
+        a story listed by several sources is only returned once.
+        """
+        with self._lock:
+            by_source = self._articles.get(category, {})
+            failures = self._failures.get(category, {})
+            articles = []
+            failed_sources = []
+            for source in sources:
+                articles.extend(by_source.get(source["source_link"], ()))
+                if source["source_link"] in failures:
+                    failed_sources.append(failures[source["source_link"]])
+        return dedupe(articles), failed_sources
+
+    def sorted_runs(self, sections):
+        """
+        Return (runs, failed_sources) for a list of (category, sources):
+        one list per source ordered by sort_key, ready for a k-way merge.
+        The lists are replaced on every poll and never changed in place.
+        """
+        with self._lock:
+            runs = []
+            failed_sources = []
+            for category, sources in sections:
+                by_source = self._sorted.get(category, {})
+                failures = self._failures.get(category, {})
+                for source in sources:
+                    run = by_source.get(source["source_link"])
+                    if run:
+                        runs.append(run)
+                    if source["source_link"] in failures:
+                        failed_sources.append(dict(failures[source["source_link"]], category=category))
+        return runs, failed_sources
+
+
+class FeedState:
+    """
+    Polling state of a single feed URL, shared by every category that lists it.
+    """
+    __slots__ = ('source', 'categories', 'interval', 'next_due', 'failures', 'fingerprint')
+
+    def __init__(self, source, interval):
+        self.source = source
+        self.categories = set()
+        self.interval = interval
+        self.next_due = 0.0
+        self.failures = 0
+        self.fingerprint = None
+
+
+class IngestScheduler:
+    """
+    Polls every source from the category file and keeps an ArticleStore current.
+    Feeds that publish often are polled more often, idle and failing feeds back
+    off towards the maximum interval.
+    """
+
+    def __init__(self, load_categories, store, build_articles, fetch=fetcher.fetch_feed,
+                 min_interval=INGEST_MIN_INTERVAL, max_interval=INGEST_MAX_INTERVAL,
+                 initial_interval=INGEST_INITIAL_INTERVAL, enabled=INGEST_ENABLED):
+        self.load_categories = load_categories
+        self.store = store
+        self.build_articles = build_articles
+        self.fetch = fetch
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_interval = initial_interval
+        self.enabled = enabled
+        self._feeds = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Start the polling thread, does nothing if it is already running or disabled.
+        Started on first use rather than at import so that packaging the app
+        doesn't spawn threads.
+        """
+        with self._lock:
+            if not self.enabled or self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name='feed-ingest', daemon=True)
+            self._thread.start()
+
+    def sync_sources(self):
+        """
+        Reconcile the polled feeds with the category file.
+        """
+        categories = self.load_categories() or {}
+        with self._lock:
+            seen = set()
+            for category, sources in categories.items():
+                for source in sources:
+                    link = source["source_link"]
+                    state = self._feeds.get(link)
+                    if state is None:
+                        state = self._feeds[link] = FeedState(source, self.initial_interval)
+                    if link not in seen:
+                        state.categories = set()
+                        state.source = source
+                        seen.add(link)
+                    state.categories.add(category)
+            for link in set(self._feeds) - seen:
+                del self._feeds[link]
+        return categories
+
+    def ingest_category(self, category, fetch=None):
+        """
+        Poll every source of one category right away and wait for the results.
+        Used when a category is requested before the scheduler has covered it,
+        fetch overrides the scheduler's fetch function for this poll.
+        """
+        for _ in self.iter_ingest_category(category, fetch):
+            pass
+
+    def ingest_categories(self, categories, fetch=None):
+        """
+        Like ingest_category for several categories, their sources are all
+        polled concurrently and a feed listed in more than one is fetched once.
+        """
+        self.sync_sources()
+        wanted = set(categories)
+        with self._lock:
+            states = [state for state in self._feeds.values() if state.categories & wanted]
+        self._poll(states, fetch)
+        self._mark_ready()
+
+    def iter_ingest_category(self, category, fetch=None):
+        """
+        Like ingest_category, but yields each source as soon as its articles
+        (or its failure) are in the store.
+        """
+        self.sync_sources()
+        with self._lock:
+            states = [state for state in self._feeds.values() if category in state.categories]
+        yield from self._iter_poll(states, fetch or self.fetch)
+        self._mark_ready()
+
+    def poll_due(self):
+        """
+        Poll the feeds whose next_due has passed and return when the next one is due.
+        """
+        now = time.monotonic()
+        with self._lock:
+            due = [state for state in self._feeds.values() if state.next_due <= now]
+        self._poll(due)
+        self._mark_ready()
+        with self._lock:
+            return min((state.next_due for state in self._feeds.values()), default=now + self.initial_interval)
+
+    def _poll(self, states, fetch=None):
+        for _ in self._iter_poll(states, fetch or self.fetch):
+            pass
+
+    def _iter_poll(self, states, fetch):
+        if not states:
+            return
+        by_link = {state.source["source_link"]: state for state in states}
+        for source, feed, error in fetcher.iter_fetch([state.source for state in states], fetch=fetch):
+            state = by_link[source["source_link"]]
+            if error is None:
+                try:
+                    self._ingest(state, feed)
+                except Exception as e:
+                    self._record_failure(state, e)
+            else:
+                self._record_failure(state, error)
+            yield source
+
+    def _mark_ready(self):
+        # A category is ready once each of its feeds has been polled at least once
+        with self._lock:
+            pending = set()
+            polled = set()
+            for state in self._feeds.values():
+                (polled if state.next_due else pending).update(state.categories)
+        for category in polled - pending:
+            self.store.mark_ready(category)
+
+    def _ingest(self, state, feed):
+        fingerprint = tuple(getattr(entry, 'link', None) for entry in feed.entries)
+        for category in state.categories:
+            self.store.put(category, state.source, self.build_articles(feed, category, state.source))
+
+        # Halve the interval when the feed changed, grow it while it stays the same
+        if fingerprint != state.fingerprint:
+            state.interval = max(self.min_interval, state.interval / 2)
+        else:
+            state.interval = min(self.max_interval, state.interval * 1.5)
+        state.fingerprint = fingerprint
+        state.failures = 0
+        state.next_due = time.monotonic() + self._jitter(state.interval)
+
+    def _record_failure(self, state, error):
+        log.error(f"Error ingesting feed from {state.source['source_link']}: {error}")
+        failure = {
+            "source_name": state.source["source_name"],
+            "status": fetcher.describe_error(error),
+            "error": str(error)
+        }
+        for category in state.categories:
+            self.store.fail(category, state.source, failure)
+
+        # Exponential backoff for failing feeds
+        state.failures += 1
+        state.interval = min(self.max_interval, state.interval * 2)
+        state.next_due = time.monotonic() + self._jitter(state.interval)
+
+    def _jitter(self, interval):
+        # Spread polls so feeds added together don't stay in lockstep
+        return interval * random.uniform(0.9, 1.1)
+
+    def _run(self):
+        while True:
+            try:
+                self.sync_sources()
+                next_due = self.poll_due()
+            except Exception as e:
+                log.error(f"Feed ingestion cycle failed: {e}")
+                next_due = time.monotonic() + self.min_interval
+            time.sleep(max(1.0, next_due - time.monotonic()))
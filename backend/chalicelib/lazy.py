@@ -0,0 +1,62 @@
+"""
+Deferred imports and object construction, so a cold start only pays for
+the dependencies and AWS clients the request actually uses.
+"""
+import importlib
+import threading
+
+
+class LazyModule:
+    """
+    Stands in for a module and imports it on first attribute access.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            # import_module holds the import lock, concurrent first uses are safe
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}{'' if self.loaded else ' (not loaded)'}>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+class LazyObject:
+    """
+    Builds an object with factory on first use and then forwards attribute
+    access to it. Construction happens once even under concurrent use.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+                instance = self._instance
+        return instance
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+    @property
+    def loaded(self):
+        return self._instance is not None
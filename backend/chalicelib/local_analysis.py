@@ -0,0 +1,158 @@
+"""
+In-process English sentiment and key phrases: a valence lexicon with
+negation and intensifier handling, and RAKE key phrase extraction.
+Answers in about a millisecond per article with no network, in the same
+shape as Comprehend.
+"""
+import re
+from collections import Counter
+
+from chalicelib.retrieval import STOPWORDS
+from chalicelib.sentiment import MAX_KEY_PHRASES, sentiment_result
+
+# Word valences from -3 (very negative) to 3 (very positive), tuned for news copy
+LEXICON = {
+    # Positive
+    'good': 1.9, 'great': 3.0, 'excellent': 3.0, 'best': 2.8, 'better': 1.9, 'positive': 2.0,
+    'success': 2.5, 'successful': 2.5, 'succeed': 2.2, 'win': 2.5, 'wins': 2.5, 'won': 2.3,
+    'victory': 2.6, 'gain': 1.8, 'gains': 1.8, 'growth': 1.6, 'grow': 1.4, 'grew': 1.4,
+    'rise': 1.0, 'rises': 1.0, 'rose': 1.0, 'surge': 1.5, 'boost': 1.7, 'boosts': 1.7,
+    'record': 0.8, 'improve': 1.9, 'improved': 1.9, 'improves': 1.9, 'improvement': 1.9,
+    'recover': 1.6, 'recovery': 1.6, 'strong': 1.7, 'stronger': 1.8, 'robust': 1.6,
+    'benefit': 1.8, 'benefits': 1.8, 'hope': 1.9, 'hopeful': 2.0, 'optimistic': 2.2,
+    'optimism': 2.2, 'happy': 2.7, 'celebrate': 2.7, 'celebrated': 2.7, 'praise': 2.6,
+    'praised': 2.6, 'support': 1.7, 'supported': 1.7, 'welcome': 2.0, 'welcomed': 2.0,
+    'agreement': 1.5, 'deal': 0.8, 'breakthrough': 2.6, 'innovative': 2.0, 'innovation': 1.8,
+    'safe': 1.9, 'safer': 1.9, 'secure': 1.4, 'stable': 1.2, 'peace': 2.5, 'peaceful': 2.4,
+    'love': 3.0, 'loved': 2.9, 'like': 1.5, 'enjoy': 2.2, 'win-win': 2.5, 'profit': 1.9,
+    'profits': 1.9, 'profitable': 2.0, 'advance': 1.3, 'advances': 1.3, 'thrive': 2.4,
+    'award': 2.5, 'awarded': 2.4, 'honor': 2.2, 'impressive': 2.6, 'remarkable': 2.3,
+    'effective': 2.0, 'efficient': 1.8, 'helpful': 1.8, 'help': 1.5, 'helped': 1.5,
+    'rescue': 1.8, 'rescued': 1.8, 'relief': 1.7, 'upbeat': 2.1, 'confident': 2.2,
+    'confidence': 2.0, 'approve': 1.9, 'approved': 1.9, 'approval': 1.8, 'healthy': 1.9,
+    # Negative
+    'bad': -2.5, 'worse': -2.1, 'worst': -3.1, 'negative': -2.0, 'fail': -2.5, 'fails': -2.5,
+    'failed': -2.5, 'failure': -2.5, 'loss': -1.9, 'losses': -1.9, 'lose': -1.9, 'lost': -1.7,
+    'decline': -1.5, 'declines': -1.5, 'declined': -1.5, 'drop': -1.2, 'drops': -1.2,
+    'dropped': -1.2, 'fall': -1.2, 'falls': -1.2, 'fell': -1.2, 'plunge': -2.0, 'plunged': -2.0,
+    'slump': -2.0, 'crash': -2.6, 'crisis': -3.1, 'recession': -2.4, 'inflation': -1.0,
+    'weak': -1.9, 'weaker': -1.9, 'risk': -1.1, 'risks': -1.1, 'threat': -2.4, 'threats': -2.4,
+    'threaten': -2.4, 'threatens': -2.4, 'fear': -2.2, 'fears': -2.2, 'worry': -1.9,
+    'worries': -1.9, 'worried': -1.9, 'concern': -1.4, 'concerns': -1.4, 'concerned': -1.4,
+    'warn': -1.6, 'warns': -1.6, 'warned': -1.6, 'warning': -1.6, 'attack': -2.6,
+    'attacks': -2.6, 'attacked': -2.6, 'war': -2.9, 'conflict': -2.2, 'violence': -3.1,
+    'violent': -2.9, 'kill': -3.4, 'killed': -3.5, 'kills': -3.4, 'death': -2.9, 'deaths': -2.9,
+    'dead': -3.3, 'die': -2.9, 'died': -2.6, 'injured': -2.1, 'injury': -2.1, 'disaster': -3.1,
+    'damage': -2.2, 'damaged': -2.2, 'destroy': -2.7, 'destroyed': -2.8, 'collapse': -2.4,
+    'scandal': -2.3, 'fraud': -2.6, 'corruption': -2.7, 'crime': -2.5, 'criminal': -2.4,
+    'arrest': -1.4, 'arrested': -1.6, 'accused': -1.8, 'lawsuit': -1.3, 'sued': -1.5,
+    'problem': -1.7, 'problems': -1.7, 'trouble': -1.9, 'struggle': -1.6, 'struggling': -1.7,
+    'angry': -2.3, 'anger': -2.3, 'outrage': -2.5, 'protest': -1.0, 'protests': -1.0,
+    'sad': -2.1, 'tragic': -3.1, 'tragedy': -3.4, 'hate': -2.7, 'condemn': -2.2,
+    'condemned': -2.2, 'criticism': -1.9, 'criticize': -1.9, 'criticized': -1.9, 'cut': -0.8,
+    'cuts': -0.8, 'layoffs': -2.2, 'unemployment': -1.9, 'debt': -1.2, 'deficit': -1.3,
+    'shortage': -1.7, 'delay': -1.2, 'delayed': -1.2, 'ban': -1.3, 'banned': -1.5,
+    'dangerous': -2.5, 'danger': -2.4, 'unsafe': -2.2, 'uncertain': -1.3, 'uncertainty': -1.4,
+    'volatile': -1.3, 'scare': -2.2, 'panic': -2.6, 'chaos': -2.6, 'reject': -1.7,
+    'rejected': -1.8, 'deny': -1.2, 'denied': -1.3, 'disappointing': -2.2, 'disappointed': -2.1,
+}
+NEGATIONS = frozenset("not no never none nobody nothing neither nor without cannot isn't aren't wasn't weren't "
+                      "don't doesn't didn't won't wouldn't can't couldn't shouldn't hasn't haven't hadn't".split())
+INTENSIFIERS = {'very': 0.3, 'extremely': 0.5, 'highly': 0.3, 'deeply': 0.3, 'really': 0.2, 'most': 0.2,
+                'slightly': -0.3, 'somewhat': -0.2, 'barely': -0.4}
+NEGATION_SCOPE = 3
+NEGATION_FACTOR = -0.74
+# How much each neutral word counts against the sentiment words
+NEUTRAL_WEIGHT = 0.35
+
+_WORD_RE = re.compile(r"[a-z]+(?:[-'][a-z]+)*")
+_PHRASE_SPLIT_RE = re.compile(r"[.,;:!?()\[\]\"—–]|\s-\s|\n")
+
+
+def sentiment_scores(words):
+    """
+    Class scores for a list of lowercase words: positive and negative mass
+    from the lexicon, neutral from the words that carry none, mixed when
+    both sides are present. The scores add up to 1.
+    """
+    positive = negative = 0.0
+    neutral = 0
+    for i, word in enumerate(words):
+        valence = LEXICON.get(word)
+        if valence is None:
+            if word not in STOPWORDS:
+                neutral += 1
+            continue
+        scale = 1.0
+        for previous in words[max(0, i - NEGATION_SCOPE):i]:
+            if previous in NEGATIONS:
+                scale *= NEGATION_FACTOR
+            elif previous in INTENSIFIERS:
+                scale *= 1 + INTENSIFIERS[previous]
+        valence *= scale
+        if valence > 0:
+            positive += valence
+        else:
+            negative -= valence
+
+    mixed = 2 * min(positive, negative)
+    total = positive + negative + mixed + neutral * NEUTRAL_WEIGHT
+    if not total:
+        return {"positive": 0.0, "negative": 0.0, "neutral": 1.0, "mixed": 0.0}
+    return {
+        "positive": positive / total,
+        "negative": negative / total,
+        "neutral": neutral * NEUTRAL_WEIGHT / total,
+        "mixed": mixed / total
+    }
+
+
+def rake_key_phrases(text, limit=MAX_KEY_PHRASES, max_words=4):
+    """
+    RAKE: candidate phrases are the runs of words between stopwords and
+    punctuation, each word scores degree / frequency and a phrase scores
+    the sum of its words.
+    """
+    candidates = []
+    for fragment in _PHRASE_SPLIT_RE.split(text):
+        phrase = []
+        for token in fragment.split():
+            word = token.strip("'“”").lower()
+            if not _WORD_RE.fullmatch(word) or word in STOPWORDS or len(word) < 2:
+                if phrase:
+                    candidates.append(phrase)
+                phrase = []
+            else:
+                phrase.append((word, token.strip("'“”")))
+        if phrase:
+            candidates.append(phrase)
+    candidates = [phrase for phrase in candidates if len(phrase) <= max_words]
+
+    frequency = Counter()
+    degree = Counter()
+    for phrase in candidates:
+        for word, _ in phrase:
+            frequency[word] += 1
+            degree[word] += len(phrase)
+
+    scored = {}
+    for phrase in candidates:
+        key = " ".join(word for word, _ in phrase)
+        if key not in scored:
+            score = sum(degree[word] / frequency[word] for word, _ in phrase)
+            scored[key] = (score, " ".join(original for _, original in phrase))
+    ranked = sorted(scored.values(), key=lambda item: -item[0])
+    return [original for _, original in ranked[:limit]]
+
+
+class LocalAnalyzer:
+    """
+    Offline analyzer with the same analyze() interface as ComprehendAnalyzer.
+    Only English is supported.
+    """
+    languages = frozenset(['en'])
+
+    def analyze(self, text, language='en'):
+        text = text.replace('’', "'")
+        scores = sentiment_scores(_WORD_RE.findall(text.lower()))
+        return sentiment_result(max(scores, key=scores.get), scores, rake_key_phrases(text), language)
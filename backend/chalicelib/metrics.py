@@ -0,0 +1,200 @@
+"""
+Lightweight in-process metrics: counters, latency histograms and span
+timers, rendered in the Prometheus text exposition format for /metrics.
+With METRICS_ENABLED=0 every call returns right away and spans are a
+shared no-op context manager.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+log = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+PREFIX = 'intellifeed_'
+# Seconds, from cache hits to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    'http_requests_total': "Requests served, by route, method and status.",
+    'http_request_duration_seconds': "Time to produce a response, by route and method.",
+    'stage_duration_seconds': "Time spent in each stage of request handling.",
+    'upstream_requests_total': "Calls to upstream services, by outcome.",
+    'upstream_duration_seconds': "Duration of calls to upstream services.",
+    'upstream_retries_total': "Retried calls to upstream services.",
+}
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def fail(self):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('registry', 'histogram', 'labels', 'counter', 'started', 'failed')
+
+    def __init__(self, registry, histogram, labels, counter=None):
+        self.registry = registry
+        self.histogram = histogram
+        self.labels = labels
+        self.counter = counter
+        self.failed = False
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.histogram, time.perf_counter() - self.started, **self.labels)
+        if self.counter:
+            self.registry.inc(self.counter, outcome='error' if exc_type or self.failed else 'ok', **self.labels)
+        return False
+
+    def fail(self):
+        """
+        Count the call as an error without raising, e.g. for an HTTP 5xx.
+        """
+        self.failed = True
+
+
+class Registry:
+    """
+    Holds every counter and histogram series, keyed by name and labels.
+    Collectors add values that live elsewhere, such as cache statistics,
+    at scrape time.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._counters = {}     # (name, labels) -> value
+        self._histograms = {}   # (name, labels) -> [bucket counts..., sum, count]
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def span(self, stage, **labels):
+        """
+        Context manager timing one stage into stage_duration_seconds.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, 'stage_duration_seconds', dict(labels, stage=stage))
+
+    def upstream(self, name):
+        """
+        Context manager timing one call to an upstream service and counting
+        its outcome. An exception or a call to fail() counts as an error.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, 'upstream_duration_seconds', {'upstream': name}, counter='upstream_requests_total')
+
+    def add_collector(self, collect):
+        """
+        Register collect(), returning (name, type, help, [(labels, value)])
+        tuples to include in every scrape.
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(series)) for key, series in self._histograms.items())
+
+        lines = []
+        declared = set()
+
+        def declare(name, kind, help_text):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {PREFIX}{name} {help_text}")
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name, 'counter', HELP.get(name, name))
+            lines.append(f"{PREFIX}{name}{_labels(labels)} {_number(value)}")
+
+        for (name, labels), series in histograms:
+            declare(name, 'histogram', HELP.get(name, name))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                lines.append(f"{PREFIX}{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {_number(series[-2])}")
+            lines.append(f"{PREFIX}{name}_count{_labels(labels)} {series[-1]}")
+
+        for collect in self._collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                log.warning(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                declare(name, kind, help_text)
+                for labels, value in samples:
+                    lines.append(f"{PREFIX}{name}{_labels(tuple(sorted(labels.items())))} {_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+# Process-wide registry used by the app and chalicelib
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+span = registry.span
+upstream = registry.upstream
+add_collector = registry.add_collector
+render = registry.render
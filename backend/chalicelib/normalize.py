@@ -0,0 +1,63 @@
+"""
+Text normalization for feed titles, summaries and article text.
+"""
+import html
+import re
+from functools import lru_cache
+
+_TAG_RE = re.compile(r'<[^>]*?>')
+# Named, decimal or hex character reference
+_ENTITY_RE = re.compile(r'&(?:#[0-9]+|#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);?')
+# Trailing "[...]" that WordPress and similar feeds append to excerpts
+_TRAILING_ELLIPSIS_RE = re.compile(r'\[\s*(?:\.\.\.|…)\s*\]\s*$')
+
+# Typographic characters feeds encode as entities, kept as plain ASCII
+# to match what the frontend has always displayed
+_ASCII_REPLACEMENTS = {
+    '“': '"',
+    '”': '"',
+    '’': "'",
+    '…': '...',
+}
+
+
+@lru_cache(maxsize=1024)
+def _decode_entity(reference):
+    decoded = html.unescape(reference)
+    return _ASCII_REPLACEMENTS.get(decoded, decoded)
+
+
+def _replace_entity(match):
+    return _decode_entity(match.group())
+
+
+def strip_markup(text):
+    """
+    Remove every tag and decode every HTML entity.
+    Tags are dropped first so decoded text like "&lt;b&gt;" is kept as "<b>".
+    """
+    if not text:
+        return text
+    if '<' in text:
+        text = _TAG_RE.sub('', text)
+    if '&' in text:
+        text = _ENTITY_RE.sub(_replace_entity, text)
+    return text
+
+
+def clean_text(text):
+    """
+    Normalize a feed title or summary: strip tags, decode entities and
+    drop a trailing "[...]" marker.
+    """
+    text = strip_markup(text)
+    if text and text.rstrip().endswith(']'):
+        text = _TRAILING_ELLIPSIS_RE.sub('', text)
+    return text
+
+
+def clean_batch(texts):
+    """
+    Normalize many titles or summaries at once, None values pass through.
+    """
+    return [clean_text(text) for text in texts]
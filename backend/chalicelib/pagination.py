@@ -0,0 +1,99 @@
+"""
+Cursor pagination and NDJSON encoding for article lists.
+"""
+import base64
+import heapq
+import json
+from bisect import bisect_right
+from itertools import islice
+
+MAX_PAGE_SIZE = 500
+
+
+class InvalidPageRequest(ValueError):
+    """
+    Raised for a malformed limit or cursor.
+    """
+
+
+def sort_key(article):
+    """
+    Newest first, ties broken by ID so the order is total and stable.
+    """
+    return (-(article.get("published_ts") or 0), article["id"])
+
+
+def encode_cursor(article):
+    key = sort_key(article)
+    return base64.urlsafe_b64encode(json.dumps([key[0], key[1]]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        published, article_id = json.loads(base64.urlsafe_b64decode(padded))
+        return (float(published), str(article_id))
+    except (ValueError, TypeError):
+        raise InvalidPageRequest("Invalid cursor")
+
+
+def parse_limit(value):
+    if value is None:
+        return None
+    try:
+        limit = int(value)
+    except (ValueError, TypeError):
+        raise InvalidPageRequest("limit must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise InvalidPageRequest(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def paginate(articles, limit=None, cursor=None):
+    """
+    Return (page, next_cursor) for articles ordered by publish time.
+    Only the requested page is ordered, older articles are never sorted.
+    """
+    if cursor:
+        after = decode_cursor(cursor)
+        articles = [article for article in articles if sort_key(article) > after]
+    if limit is None:
+        return sorted(articles, key=sort_key), None
+
+    page = heapq.nsmallest(limit + 1, articles, key=sort_key)
+    if len(page) > limit:
+        page = page[:limit]
+        return page, encode_cursor(page[-1])
+    return page, None
+
+
+def merge_page(runs, limit, cursor=None):
+    """
+    Return (page, next_cursor) for lists that are each already ordered by
+    sort_key, such as every source's articles. A k-way heap merge reads
+    only about limit articles from the heads of the lists, nothing is sorted
+    and articles listed more than once are only returned the first time.
+    """
+    if cursor:
+        after = decode_cursor(cursor)
+        runs = [islice(run, bisect_right(run, after, key=sort_key), None) for run in runs]
+
+    page = []
+    seen = set()
+    for article in heapq.merge(*runs, key=sort_key):
+        if article["id"] in seen:
+            continue
+        seen.add(article["id"])
+        page.append(article)
+        if len(page) > limit:
+            page.pop()
+            return page, encode_cursor(page[-1])
+    return page, None
+
+
+def ndjson_lines(records):
+    """
+    Encode records as newline-delimited JSON, one line per record.
+    """
+    for record in records:
+        yield json.dumps(record, separators=(',', ':')) + '\n'
@@ -0,0 +1,145 @@
+"""
+Prompt assembly for the chat models with per-model size budgets.
+Recent turns are sent verbatim, older ones are folded into a short summary
+so the prompt stops growing with the conversation.
+"""
+import hashlib
+import json
+import re
+
+from chalicelib.cache import MemoryBackend, TTLCache
+
+# Characters reserved for the instructions, title and conversation, the
+# rest of a model's budget goes to the article
+NON_ARTICLE_RESERVE = 600
+SUMMARY_LINE_LENGTH = 120
+
+_FIRST_SENTENCE_RE = re.compile(r'^(.+?[.!?])(?:\s|$)', re.S)
+
+
+def _first_sentence(text):
+    match = _FIRST_SENTENCE_RE.match(text.strip())
+    sentence = match.group(1) if match else text.strip()
+    if len(sentence) > SUMMARY_LINE_LENGTH:
+        sentence = sentence[:SUMMARY_LINE_LENGTH - 3] + "..."
+    return " ".join(sentence.split())
+
+
+class PromptBuilder:
+    """
+    Builds model prompts within a character budget per model.
+    """
+
+    def __init__(self, budgets, default_budget=2400, recent_turns=6, summary_cache_bytes=2 * 1024 * 1024):
+        self.budgets = budgets
+        self.default_budget = default_budget
+        self.recent_turns = recent_turns
+        self._summaries = TTLCache(MemoryBackend(summary_cache_bytes), ttl=3600)
+
+    def budget(self, model):
+        return self.budgets.get(model, self.default_budget)
+
+    def article_budget(self, model):
+        """
+        How many characters of article text fit in a prompt for this model.
+        """
+        return max(500, self.budget(model) - NON_ARTICLE_RESERVE)
+
+    def window(self, messages, budget):
+        """
+        Split a conversation into (summary of older turns, recent turns).
+        Recent turns are the newest ones that fit in budget, at most recent_turns.
+        """
+        turns = [msg for msg in messages if msg['role'] != 'system']
+        recent = []
+        used = 0
+        for msg in reversed(turns):
+            cost = len(msg['content']) + 16
+            # Always keep the latest turn, it's the question being asked
+            if recent and (len(recent) >= self.recent_turns or used + cost > budget):
+                break
+            recent.append(msg)
+            used += cost
+        recent.reverse()
+        older = turns[:len(turns) - len(recent)]
+        # The summary gets what the recent turns left, up to a third of the budget
+        return self.summarize(older, min(budget - used, budget // 3)), recent
+
+    def summarize(self, messages, budget):
+        """
+        Extractive summary of older turns, the first sentence of each, cached
+        per conversation prefix so it is built once per new turn.
+        """
+        if not messages or budget <= 0:
+            return ""
+        key = hashlib.sha256(json.dumps([[m['role'], m['content']] for m in messages]).encode()).hexdigest()
+        lines = self._summaries.get(key)
+        if lines is None:
+            lines = [f"{'User' if m['role'] == 'user' else 'Assistant'}: {_first_sentence(m['content'])}" for m in messages]
+            self._summaries.set(key, lines)
+        # Keep the latest lines that fit
+        kept = []
+        used = 0
+        for line in reversed(lines):
+            if used + len(line) + 1 > budget:
+                break
+            kept.append(line)
+            used += len(line) + 1
+        return "\n".join(reversed(kept))
+
+    def build(self, messages, system_message, model):
+        """
+        Format the conversation based on the model being used.
+        Different models expect different prompt formats.
+        """
+        model_name = model.lower()
+        history_budget = max(0, self.budget(model) - len(system_message))
+        summary, recent = self.window(messages, history_budget)
+        if summary:
+            system_message = f"{system_message}\nEarlier in this conversation:\n{summary}\n"
+        parts = []
+
+        if "mistral" in model_name:
+            # Mistral format
+            parts.append(f"<s>[INST] {system_message} [/INST]</s>\n\n")
+            for msg in recent:
+                if msg['role'] == 'user':
+                    parts.append(f"<s>[INST] {msg['content']} [/INST]")
+                elif msg['role'] == 'assistant':
+                    parts.append(f" {msg['content']} </s>\n")
+            # Add the final user message if the last message was from the user
+            if recent and recent[-1]['role'] == 'user':
+                parts.append(" ")
+
+        elif "llama" in model_name or "opt" in model_name:
+            # Llama 2 / OPT format - similar with system message
+            parts.append(f"<s>[INST] <<SYS>>\n{system_message}\n<</SYS>>\n\n")
+            for i, msg in enumerate(recent):
+                if msg['role'] == 'user':
+                    if i > 0 and recent[i - 1]['role'] == 'assistant':
+                        parts.append(f"[/INST] {recent[i - 1]['content']} </s><s>[INST] {msg['content']}")
+                    else:
+                        parts.append(msg['content'])
+                elif msg['role'] == 'assistant' and i == len(recent) - 1:
+                    parts.append(f" [/INST] {msg['content']}")
+            if recent and recent[-1]['role'] == 'user':
+                parts.append(" [/INST]")
+
+        elif "t5" in model_name:
+            # T5 models prefer a targeted prompt that only includes the question
+            user_question = next((msg['content'] for msg in reversed(recent) if msg['role'] == 'user'), "")
+            parts.append(f"Answer this question based on the article context.\n\nArticle: {system_message}\n\nQuestion: {user_question}\n\nAnswer:")
+
+        else:
+            # For other models, use a more conversational format
+            parts.append(f"System: {system_message}\n\n")
+            for msg in recent:
+                if msg['role'] == 'user':
+                    parts.append(f"User: {msg['content']}\n")
+                elif msg['role'] == 'assistant':
+                    parts.append(f"Assistant: {msg['content']}\n")
+            # Add the final prompt for the model to continue
+            if recent and recent[-1]['role'] == 'user':
+                parts.append("Assistant: ")
+
+        return "".join(parts)
@@ -0,0 +1,74 @@
+"""
+Cached view of rss_feeds.json, reloaded only when the file changes.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# How often the file's mtime is checked, in seconds
+CATEGORY_RELOAD_INTERVAL = float(os.getenv('CATEGORY_RELOAD_INTERVAL', '5'))
+
+
+class CategorySnapshot:
+    """
+    One loaded version of the category file with the responses derived from it.
+    """
+
+    def __init__(self, categories, mtime):
+        self.categories = categories
+        self.mtime = mtime
+        # Structure the /categories response to match what the frontend expects
+        self.categories_payload = json.dumps({
+            category: [{"source_name": source["source_name"]} for source in sources]
+            for category, sources in categories.items()
+        }, separators=(',', ':'))
+
+
+class CategoryRegistry:
+    """
+    Loads the category file once and reloads it when its mtime changes.
+    The mtime is checked at most every reload_interval seconds, so steady
+    state reads do no disk I/O or JSON work.
+    """
+
+    def __init__(self, path='rss_feeds.json', reload_interval=CATEGORY_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._snapshot = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Return the current CategorySnapshot, or None if the file was never loaded.
+        """
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.reload_interval:
+            return self._snapshot
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.reload_interval:
+                self._reload_if_changed()
+                self._checked_at = now
+            return self._snapshot
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            log.error(f"{self.path} not found")
+            return
+        if self._snapshot is not None and self._snapshot.mtime == mtime:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                categories = json.load(f)
+        except json.JSONDecodeError:
+            # Keep serving the last good version while the file is being edited
+            log.error(f"Invalid JSON format in {self.path}")
+            return
+        self._snapshot = CategorySnapshot(categories, mtime)
+        log.info(f"Loaded {len(categories)} categories from {self.path}")
@@ -0,0 +1,103 @@
+"""
+Circuit breaker and retry backoff helpers for upstream services.
+"""
+import random
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an upstream that is known to be unhealthy.
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for
+    reset_timeout seconds. After that one trial call is let through: success
+    closes the circuit, failure opens it again. A trial that reports neither
+    within reset_timeout is given up and the next call becomes the trial.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._trial_started_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Whether a call may go to the upstream now.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+            if self.state == self.HALF_OPEN and (
+                    not self._trial_running or now - self._trial_started_at >= self.reset_timeout):
+                self._trial_running = True
+                self._trial_started_at = now
+                return True
+            return False
+
+    def check(self):
+        """
+        Raise CircuitOpenError if the upstream shouldn't be called.
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable, circuit open")
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    """
+    Full-jitter exponential backoff: a random delay up to base * 2**attempt.
+    Jitter keeps workers that failed together from retrying together.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class Deadline:
+    """
+    Time budget shared by every attempt of one logical call.
+    """
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def sleep(self, seconds):
+        """
+        Sleep for seconds unless that would pass the deadline, return whether it slept.
+        """
+        if seconds >= self.remaining():
+            return False
+        time.sleep(seconds)
+        return True
@@ -0,0 +1,145 @@
+"""
+Question-aware article context for /chat.
+Articles are split into chunks and indexed with BM25, and the chunks most
+relevant to the latest question are packed into the prompt budget.
+"""
+import hashlib
+import math
+import os
+import re
+from collections import Counter
+
+from chalicelib.cache import MemoryBackend, TTLCache
+
+CHUNK_SIZE = 400
+CHUNK_OVERLAP_SENTENCES = 1
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+|\n+')
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOPWORDS = frozenset(
+    "a an the and or but if of to in on at by for with about as from into over after before "
+    "is are was were be been being do does did have has had this that these those it its "
+    "i you he she we they them his her their our your my me what which who whom when where "
+    "why how not no so than too very can will would should could just also there here".split()
+)
+
+# Indexes are reused across the turns of a conversation about one article
+_index_cache = TTLCache(
+    MemoryBackend(int(os.getenv('CHAT_INDEX_CACHE_MAX_BYTES', str(8 * 1024 * 1024))), sizeof=lambda index: index.size),
+    ttl=float(os.getenv('CHAT_INDEX_CACHE_TTL', '3600'))
+)
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP_SENTENCES):
+    """
+    Split text into chunks of about size characters on sentence boundaries,
+    repeating the last overlap sentences at the start of the next chunk.
+    """
+    sentences = [sentence.strip() for sentence in _SENTENCE_RE.split(text) if sentence.strip()]
+    chunks = []
+    current = []
+    length = 0
+    for sentence in sentences:
+        if current and length + len(sentence) > size:
+            chunks.append(" ".join(current))
+            current = current[-overlap:] if overlap else []
+            length = sum(len(s) + 1 for s in current)
+        current.append(sentence)
+        length += len(sentence) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class ArticleIndex:
+    """
+    BM25 index over the chunks of one article.
+    """
+
+    def __init__(self, text):
+        self.chunks = chunk_text(text)
+        self.term_counts = [Counter(tokenize(chunk)) for chunk in self.chunks]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0
+        document_frequency = Counter()
+        for counts in self.term_counts:
+            document_frequency.update(counts.keys())
+        total = len(self.chunks)
+        self.idf = {
+            term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+        self.size = sum(len(chunk) for chunk in self.chunks) * 2
+
+    def scores(self, question):
+        """
+        BM25 score of every chunk for a question.
+        """
+        terms = [term for term in set(tokenize(question)) if term in self.idf]
+        scores = [0.0] * len(self.chunks)
+        if not terms or not self.average_length:
+            return scores
+        for i, counts in enumerate(self.term_counts):
+            norm = K1 * (1 - B + B * self.lengths[i] / self.average_length)
+            score = 0.0
+            for term in terms:
+                frequency = counts.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (K1 + 1) / (frequency + norm)
+            scores[i] = score
+        return scores
+
+
+def get_index(text):
+    """
+    Return the cached index for an article text, building it on first use.
+    """
+    key = hashlib.sha256(text.encode()).hexdigest()
+    index = _index_cache.get(key)
+    if index is None:
+        index = ArticleIndex(text)
+        _index_cache.set(key, index)
+    return index
+
+
+def select_context(text, question, budget):
+    """
+    Return at most budget characters of the article for answering question.
+    The lead chunk is always kept since it usually says what the story is
+    about, then the best scoring chunks fill the rest. Chunks keep their
+    article order and gaps are marked with "...".
+    """
+    if len(text) <= budget:
+        return text
+    index = get_index(text)
+    if not index.chunks:
+        return text[:budget]
+
+    scores = index.scores(question or "")
+    ranked = sorted(range(1, len(index.chunks)), key=lambda i: (-scores[i], i))
+    selected = [0]
+    used = len(index.chunks[0])
+    for i in ranked:
+        cost = len(index.chunks[i]) + 5
+        if used + cost <= budget:
+            selected.append(i)
+            used += cost
+
+    parts = []
+    previous = None
+    for i in sorted(selected):
+        if previous is not None and i != previous + 1:
+            parts.append("...")
+        parts.append(index.chunks[i])
+        previous = i
+    if previous != len(index.chunks) - 1:
+        parts.append("...")
+    return "\n".join(parts)[:budget]
@@ -0,0 +1,227 @@
+"""
+In-process full-text search over ingested articles.
+An inverted index maps every term to the articles containing it, with the
+term's positions so quoted phrases can be matched. Titles, summaries and,
+once an article has been extracted, its body are indexed and ranked with
+BM25, titles weighing the most.
+"""
+import heapq
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from chalicelib.identity import normalize_url
+from chalicelib.retrieval import B, K1, tokenize
+
+SEARCH_MAX_DOCUMENTS = int(os.getenv('SEARCH_MAX_DOCUMENTS', '20000'))
+# Recent results, reused until the index changes
+SEARCH_RESULT_CACHE_ENTRIES = int(os.getenv('SEARCH_RESULT_CACHE_ENTRIES', '512'))
+
+# Each occurrence of a term counts this much towards its frequency
+TITLE_WEIGHT = 3.0
+SUMMARY_WEIGHT = 1.0
+BODY_WEIGHT = 0.5
+
+_PHRASE_RE = re.compile(r'"([^"]*)"')
+
+
+def parse_query(query):
+    """
+    Split a query into (terms, phrases). Every term must match, quoted
+    phrases must also appear as consecutive words.
+    """
+    phrases = [tokenize(phrase) for phrase in _PHRASE_RE.findall(query)]
+    terms = tokenize(_PHRASE_RE.sub(' ', query))
+    for phrase in phrases:
+        terms.extend(phrase)
+    return list(dict.fromkeys(terms)), [phrase for phrase in phrases if len(phrase) > 1]
+
+
+class _Document:
+    __slots__ = ('article', 'categories', 'url', 'terms', 'length', 'fields')
+
+    def __init__(self, article, categories, url, terms, length, fields):
+        self.article = article
+        self.categories = categories
+        self.url = url
+        self.terms = terms      # term -> (weighted frequency, positions)
+        self.length = length
+        self.fields = fields    # what was indexed, to skip unchanged updates
+
+
+class SearchIndex:
+    """
+    Inverted index of article IDs, updated one article at a time as feeds
+    are polled. Bounded, the least recently updated articles are dropped
+    first.
+    """
+
+    def __init__(self, max_documents=SEARCH_MAX_DOCUMENTS, result_cache_entries=SEARCH_RESULT_CACHE_ENTRIES):
+        self.max_documents = max_documents
+        self.result_cache_entries = result_cache_entries
+        self._documents = OrderedDict()   # article id -> _Document
+        self._postings = {}               # term -> {article id: (weighted frequency, positions)}
+        self._lengths = {}                # article id -> weighted length
+        self._by_url = {}                 # normalized link -> article id
+        self._total_length = 0.0
+        self._version = 0
+        self._results = OrderedDict()     # (query, categories, limit) -> (version, results, total)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, article, body=None):
+        """
+        Index an article, or update it if its ID is already indexed.
+        The body of an earlier add_body is kept when body is None.
+        """
+        with self._lock:
+            previous = self._documents.get(article["id"])
+            categories = set(previous.categories) if previous else set()
+            categories.add(article["category"])
+            if body is None and previous is not None:
+                body = previous.fields[2]
+            fields = (article.get("title") or "", article.get("summary") or "", body)
+            if previous is not None and previous.fields == fields:
+                previous.article = article
+                previous.categories = categories
+                self._documents.move_to_end(article["id"])
+                return
+            self._index(article, categories, fields)
+
+    def add_many(self, articles):
+        for article in articles:
+            self.add(article)
+
+    def add_body(self, url, text):
+        """
+        Index the extracted text of the article linked at url.
+        Returns False when no indexed article has that link.
+        """
+        with self._lock:
+            document = self._documents.get(self._by_url.get(normalize_url(url)))
+            if document is None:
+                return False
+            if document.fields[2] != text:
+                self._index(document.article, document.categories, document.fields[:2] + (text,))
+            return True
+
+    def search(self, query, categories=None, limit=20):
+        """
+        Return (results, total): the best matching articles with their
+        score, most relevant first, and how many articles matched.
+        """
+        categories = frozenset(categories or ())
+        cache_key = (query, categories, limit)
+        with self._lock:
+            cached = self._results.get(cache_key)
+            if cached is not None and cached[0] == self._version:
+                self._results.move_to_end(cache_key)
+                return cached[1], cached[2]
+            results, total = self._search(query, categories, limit)
+            self._results[cache_key] = (self._version, results, total)
+            while len(self._results) > self.result_cache_entries:
+                self._results.popitem(last=False)
+        return results, total
+
+    def _search(self, query, categories, limit):
+        terms, phrases = parse_query(query)
+        postings = [self._postings.get(term) for term in terms]
+        if not terms or not all(postings):
+            return [], 0
+
+        # Intersect the key sets, starting from the rarest term
+        postings.sort(key=len)
+        candidates = postings[0].keys()
+        for posting in postings[1:]:
+            candidates = candidates & posting.keys()
+        if categories:
+            candidates = [
+                article_id for article_id in candidates
+                if not categories.isdisjoint(self._documents[article_id].categories)
+            ]
+        if phrases:
+            candidates = [
+                article_id for article_id in candidates
+                if all(self._contains_phrase(article_id, phrase) for phrase in phrases)
+            ]
+        if not candidates:
+            return [], 0
+
+        # BM25, with the length normalization folded into two constants
+        total_documents = len(self._documents)
+        base = K1 * (1 - B)
+        per_length = K1 * B * total_documents / self._total_length
+        lengths = self._lengths
+        scores = dict.fromkeys(candidates, 0.0)
+        for posting in postings:
+            weight = math.log(1 + (total_documents - len(posting) + 0.5) / (len(posting) + 0.5)) * (K1 + 1)
+            for article_id in scores:
+                frequency = posting[article_id][0]
+                scores[article_id] += weight * frequency / (frequency + base + per_length * lengths[article_id])
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], self._documents[item[0]].article.get("published_ts") or 0))
+        return [dict(self._documents[article_id].article, score=round(score, 4)) for article_id, score in best], len(scores)
+
+    def _contains_phrase(self, article_id, phrase):
+        # Narrow the start positions word by word, position lists are short
+        terms = self._documents[article_id].terms
+        starts = terms[phrase[0]][1]
+        for offset, term in enumerate(phrase[1:], 1):
+            positions = terms[term][1]
+            starts = [start for start in starts if start + offset in positions]
+            if not starts:
+                return False
+        return True
+
+    def _index(self, article, categories, fields):
+        article_id = article["id"]
+        self._remove(article_id)
+
+        terms = {}
+        position = 0
+        length = 0.0
+        for text, weight in zip(fields, (TITLE_WEIGHT, SUMMARY_WEIGHT, BODY_WEIGHT)):
+            tokens = tokenize(text) if text else []
+            for token in tokens:
+                entry = terms.get(token)
+                if entry is None:
+                    entry = terms[token] = [0.0, []]
+                entry[0] += weight
+                entry[1].append(position)
+                position += 1
+            length += weight * len(tokens)
+            # Leave a gap so phrases can't run from one field into the next
+            position += 1
+
+        terms = {term: (frequency, positions) for term, (frequency, positions) in terms.items()}
+        for term, entry in terms.items():
+            self._postings.setdefault(term, {})[article_id] = entry
+        url = normalize_url(article["link"]) if article.get("link") else None
+        if url:
+            self._by_url[url] = article_id
+        self._documents[article_id] = _Document(article, categories, url, terms, length, fields)
+        self._lengths[article_id] = length
+        self._total_length += length
+        self._version += 1
+
+        while len(self._documents) > self.max_documents:
+            self._remove(next(iter(self._documents)))
+
+    def _remove(self, article_id):
+        document = self._documents.pop(article_id, None)
+        if document is None:
+            return
+        for term in document.terms:
+            posting = self._postings[term]
+            del posting[article_id]
+            if not posting:
+                del self._postings[term]
+        if document.url and self._by_url.get(document.url) == article_id:
+            del self._by_url[document.url]
+        del self._lengths[article_id]
+        self._total_length -= document.length
+        self._version += 1
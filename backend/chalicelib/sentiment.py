@@ -0,0 +1,220 @@
+"""
+Whole-article sentiment and key phrases with Amazon Comprehend's batch APIs.
+Articles are cut into segments under the per-document size limit, the
+sentiment and key phrase batches run concurrently and the segment results
+are aggregated into one response.
+"""
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from chalicelib import metrics
+from chalicelib.lazy import lazy_import
+
+botocore_exceptions = lazy_import('botocore.exceptions')
+
+log = logging.getLogger(__name__)
+
+# Comprehend takes at most 5000 bytes per document and 25 documents per batch call
+COMPREHEND_MAX_BYTES = int(os.getenv('COMPREHEND_MAX_BYTES', '4900'))
+COMPREHEND_BATCH_SIZE = 25
+SENTIMENT_WORKERS = int(os.getenv('SENTIMENT_WORKERS', '4'))
+MAX_KEY_PHRASES = 15
+# A Comprehend analysis slower than this counts against its circuit breaker
+COMPREHEND_SLOW_SECONDS = float(os.getenv('COMPREHEND_SLOW_SECONDS', '3'))
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+class SentimentError(Exception):
+    """
+    Raised when no segment of the text could be analyzed.
+    """
+
+
+def segment_text(text, limit=COMPREHEND_MAX_BYTES):
+    """
+    Pack sentences into segments of at most limit UTF-8 bytes.
+    """
+    segments = []
+    current = ""
+    for sentence in _SENTENCE_RE.split(text):
+        sentence = sentence.strip()
+        while len(sentence.encode('utf-8')) > limit:
+            head = sentence.encode('utf-8')[:limit].decode('utf-8', errors='ignore')
+            cut = head.rfind(' ')
+            if cut > 0:
+                head = head[:cut]
+            segments.append(head)
+            sentence = sentence[len(head):].strip()
+        if not sentence:
+            continue
+        candidate = f"{current} {sentence}" if current else sentence
+        if current and len(candidate.encode('utf-8')) > limit:
+            segments.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        segments.append(current)
+    return segments
+
+
+def sentiment_result(dominant_sentiment, scores, key_phrases, language):
+    """
+    Build the /sentiment-analysis response from class scores.
+    """
+    # Calculate an overall sentiment score from -1 (very negative) to 1 (very positive)
+    if dominant_sentiment == 'positive':
+        sentiment_score = scores['positive']
+    elif dominant_sentiment == 'negative':
+        sentiment_score = -scores['negative']
+    elif dominant_sentiment == 'mixed':
+        sentiment_score = (scores['positive'] - scores['negative']) / 2
+    else:  # neutral
+        sentiment_score = 0
+    return {
+        "success": True,
+        "dominant_sentiment": dominant_sentiment,
+        "sentiment_score": sentiment_score,
+        "scores": scores,
+        "key_phrases": key_phrases,
+        "language": language
+    }
+
+
+def text_key(text, language):
+    return f"{hashlib.sha256(text.encode()).hexdigest()}:{language}"
+
+
+class ComprehendAnalyzer:
+    """
+    Analyzes whole articles with one shared Comprehend client. Results are
+    cached by article hash and language.
+    """
+
+    def __init__(self, client, cache=None, max_workers=SENTIMENT_WORKERS):
+        self.client = client
+        self.cache = cache
+        self.max_workers = max_workers
+
+    def analyze(self, text, language):
+        key = text_key(text, language)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        segments = segment_text(text)
+        if not segments:
+            raise SentimentError("No text to analyze")
+        batches = [segments[i:i + COMPREHEND_BATCH_SIZE] for i in range(0, len(segments), COMPREHEND_BATCH_SIZE)]
+
+        # Sentiment and key phrase batches all run at the same time
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, 2 * len(batches))) as pool:
+            sentiment_futures = [pool.submit(self._batch, self.client.batch_detect_sentiment, batch, language) for batch in batches]
+            phrase_futures = [pool.submit(self._batch, self.client.batch_detect_key_phrases, batch, language) for batch in batches]
+            sentiments = [(batch[item['Index']], item) for batch, future in zip(batches, sentiment_futures) for item in future.result()]
+            phrases = [item for future in phrase_futures for item in future.result()]
+
+        if not sentiments:
+            raise SentimentError("Comprehend could not analyze any part of the text")
+        result = sentiment_result(*self._aggregate_sentiment(sentiments), self._aggregate_phrases(phrases), language)
+        if self.cache is not None:
+            self.cache.set(key, result)
+        return result
+
+    @staticmethod
+    def _batch(call, batch, language):
+        with metrics.upstream('comprehend'):
+            response = call(TextList=batch, LanguageCode=language)
+        for error in response.get('ErrorList', []):
+            log.warning(f"Comprehend skipped a segment: {error.get('ErrorCode')} {error.get('ErrorMessage')}")
+        return response.get('ResultList', [])
+
+    @staticmethod
+    def _aggregate_sentiment(sentiments):
+        """
+        Average the segment scores weighted by segment length, the dominant
+        sentiment is the class with the highest average.
+        """
+        totals = Counter()
+        weight = 0
+        for segment, item in sentiments:
+            length = len(segment)
+            for label, score in item.get('SentimentScore', {}).items():
+                totals[label.lower()] += score * length
+            weight += length
+        scores = {label: totals[label] / weight for label in ('positive', 'negative', 'neutral', 'mixed')}
+        return max(scores, key=scores.get), scores
+
+    @staticmethod
+    def _aggregate_phrases(phrases):
+        """
+        Confident key phrases from every segment, the most frequent first.
+        """
+        counts = Counter()
+        best = {}
+        first_seen = {}
+        for item in phrases:
+            for phrase in item.get('KeyPhrases', []):
+                if phrase.get('Score', 0) <= 0.5:  # Only keep high confidence phrases
+                    continue
+                key = phrase['Text'].lower()
+                counts[key] += 1
+                best.setdefault(key, phrase['Text'])
+                first_seen.setdefault(key, len(first_seen))
+        ranked = sorted(counts, key=lambda key: (-counts[key], first_seen[key]))
+        return [best[key] for key in ranked[:MAX_KEY_PHRASES]]
+
+
+class SentimentService:
+    """
+    Chooses the engine for each analysis. "comprehend" and "local" force
+    one, "auto" uses Comprehend and falls back to the local engine while
+    Comprehend is failing or slow, tracked by a circuit breaker. The
+    response says which engine answered.
+    """
+    ENGINES = ('auto', 'comprehend', 'local')
+
+    def __init__(self, remote, local, breaker, slow_after=COMPREHEND_SLOW_SECONDS):
+        self.remote = remote
+        self.local = local
+        self.breaker = breaker
+        self.slow_after = slow_after
+
+    def analyze(self, text, language, engine='auto'):
+        # Checked before the breaker, a half-open trial must end in an outcome
+        if not text or not text.strip():
+            raise SentimentError("No text to analyze")
+        if engine == 'local':
+            return dict(self.local.analyze(text, language), engine='local')
+        fallback = engine == 'auto' and language in self.local.languages
+
+        if fallback and not self.breaker.allow():
+            return dict(self.local.analyze(text, language), engine='local')
+        if not fallback:
+            self.breaker.check()
+        started = time.monotonic()
+        try:
+            result = self.remote.analyze(text, language)
+        except (botocore_exceptions.ClientError, botocore_exceptions.BotoCoreError) as e:
+            self.breaker.record_failure()
+            if not fallback:
+                raise
+            log.warning(f"Comprehend failed, answering locally: {e}")
+            return dict(self.local.analyze(text, language), engine='local')
+        except Exception:
+            # Anything else still releases a half-open trial
+            self.breaker.record_failure()
+            raise
+        if time.monotonic() - started > self.slow_after:
+            log.warning(f"Comprehend took {time.monotonic() - started:.1f}s")
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return dict(result, engine='comprehend')
@@ -0,0 +1,203 @@
+"""
+Full-length speech synthesis: text is split on sentence boundaries into
+chunks Polly accepts, the chunks are synthesized in parallel and the MP3s
+joined in order. Audio is cached by content.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from chalicelib import metrics
+from chalicelib.cache import MemoryBackend, TTLCache
+
+log = logging.getLogger(__name__)
+
+# Polly rejects requests with more than 3000 billed characters
+POLLY_MAX_CHARS = 3000
+SPEECH_CHUNK_CHARS = min(int(os.getenv('SPEECH_CHUNK_CHARS', '2900')), POLLY_MAX_CHARS)
+SPEECH_WORKERS = int(os.getenv('SPEECH_WORKERS', '4'))
+# Longest text synthesized in one request: at least 21 Polly calls, more when
+# sentence breaks leave chunks short, run SPEECH_WORKERS at a time
+SPEECH_MAX_CHARS = int(os.getenv('SPEECH_MAX_CHARS', '60000'))
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', '/tmp/intellifeed/audio')
+AUDIO_CACHE_MAX_BYTES = int(os.getenv('AUDIO_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+AUDIO_CACHE_MEMORY_BYTES = int(os.getenv('AUDIO_CACHE_MEMORY_BYTES', str(32 * 1024 * 1024)))
+# The cache lives in the /tmp of one process. On Lambda the next request may
+# reach another container without the file, so audio URLs are only handed
+# out where every request is served from the same store
+AUDIO_URLS_ENABLED = os.getenv('AUDIO_URLS_ENABLED', '0' if os.getenv('AWS_LAMBDA_FUNCTION_NAME') else '1') == '1'
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+class SpeechError(Exception):
+    """
+    Raised when Polly returned no audio for a chunk.
+    """
+
+
+def split_for_speech(text, limit=SPEECH_CHUNK_CHARS):
+    """
+    Split text into chunks of at most limit characters, ending on sentence
+    boundaries where possible so the joins aren't audible. Sentences that
+    are too long on their own are split between words.
+    """
+    pieces = []
+    for sentence in _SENTENCE_RE.split(text):
+        sentence = sentence.strip()
+        while len(sentence) > limit:
+            cut = sentence.rfind(' ', 0, limit)
+            if cut <= 0:
+                cut = limit
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].strip()
+        if sentence:
+            pieces.append(sentence)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > limit:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def synthesize_chunks(client, chunks, params, max_workers=SPEECH_WORKERS):
+    """
+    Synthesize each chunk with the same Polly parameters and return the MP3
+    data joined in chunk order. MP3 is a sequence of independent frames, so
+    the parts can be concatenated as they are.
+    """
+    def synthesize(chunk):
+        with metrics.upstream('polly'):
+            response = client.synthesize_speech(Text=chunk, **params)
+            if "AudioStream" not in response:
+                raise SpeechError("Polly returned no audio")
+            return response["AudioStream"].read()
+
+    if len(chunks) == 1:
+        return synthesize(chunks[0])
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+        return b"".join(pool.map(synthesize, chunks))
+
+
+class AudioCache:
+    """
+    Content-addressed MP3 cache: a byte-bounded memory tier in front of
+    files on disk. The key covers the text and the voice settings, so an
+    entry never goes stale and the disk tier only evicts for space.
+    """
+
+    def __init__(self, directory=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_BYTES,
+                 memory_bytes=AUDIO_CACHE_MEMORY_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._memory = TTLCache(MemoryBackend(memory_bytes, sizeof=len), ttl=24 * 3600)
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    @staticmethod
+    def key(text, voice_id, language_code, engine='neural'):
+        text_hash = hashlib.sha256(text.encode()).hexdigest()
+        return hashlib.sha256(f"{text_hash}:{voice_id}:{language_code}:{engine}".encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def get(self, key):
+        """
+        Return the cached audio for a key, or None.
+        """
+        audio = self._memory.get(key)
+        if audio is not None:
+            self.stats["memory_hits"] += 1
+            return audio
+        try:
+            with open(self._path(key), 'rb') as f:
+                audio = f.read()
+        except FileNotFoundError:
+            self.stats["misses"] += 1
+            return None
+        except OSError as e:
+            log.warning(f"Could not read cached audio {key}: {e}")
+            self.stats["misses"] += 1
+            return None
+        self.stats["disk_hits"] += 1
+        self._memory.set(key, audio)
+        return audio
+
+    def put(self, key, audio):
+        self._memory.set(key, audio)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning(f"Could not cache audio {key}: {e}")
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk()
+            else:
+                self._disk_bytes += len(audio)
+            if self._disk_bytes > self.max_bytes:
+                self._evict_disk()
+
+    def _scan_disk(self):
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.mp3'):
+                total += entry.stat().st_size
+        return total
+
+    def _evict_disk(self):
+        # Drop the least recently written files until back under budget
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.mp3'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+
+def parse_range(header, length):
+    """
+    Parse a single "bytes=start-end" Range header into (start, end)
+    inclusive, or return None if it is missing, unsupported or unsatisfiable.
+    """
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', (header or '').strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if match.group(1):
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else length - 1
+    else:
+        # Suffix range, the last n bytes
+        start = max(0, length - int(match.group(2)))
+        end = length - 1
+    end = min(end, length - 1)
+    if start > end:
+        return None
+    return start, end
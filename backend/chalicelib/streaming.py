@@ -0,0 +1,74 @@
+"""
+Incremental cleanup of streamed model output.
+"""
+
+
+class StopPhraseFilter:
+    """
+    Applies the same cleanup as clean_assistant_response to text that arrives
+    in pieces: a leading prefix such as "Assistant:" is dropped and output
+    ends at the first stop phrase. Text that could still turn out to be the
+    start of a stop phrase, and trailing whitespace, is held back until the
+    next piece decides it.
+    """
+
+    def __init__(self, stop_phrases, prefixes=()):
+        self.stop_phrases = tuple(stop_phrases)
+        self.prefixes = tuple(prefixes)
+        self.stopped = False
+        self._buffer = ""
+        self._started = False
+
+    def feed(self, text):
+        """
+        Add a piece of model output and return the part that is safe to emit.
+        """
+        if self.stopped:
+            return ""
+        self._buffer += text
+
+        if not self._started:
+            stripped = self._buffer.lstrip()
+            # Wait until we know whether the output starts with a prefix
+            if any(prefix.startswith(stripped) for prefix in self.prefixes if len(stripped) < len(prefix)):
+                return ""
+            for prefix in self.prefixes:
+                if stripped.startswith(prefix):
+                    stripped = stripped[len(prefix):].lstrip()
+                    break
+            self._buffer = stripped
+            self._started = bool(stripped)
+            if not self._started:
+                return ""
+
+        cut = min((self._buffer.find(phrase) for phrase in self.stop_phrases if phrase in self._buffer), default=-1)
+        if cut >= 0:
+            self.stopped = True
+            emit, self._buffer = self._buffer[:cut].rstrip(), ""
+            return emit
+
+        # Hold back a possible partial stop phrase and any trailing whitespace
+        safe = len(self._buffer)
+        for phrase in self.stop_phrases:
+            for length in range(min(len(phrase) - 1, len(self._buffer)), 0, -1):
+                if self._buffer.endswith(phrase[:length]):
+                    safe = min(safe, len(self._buffer) - length)
+                    break
+        safe = len(self._buffer[:safe].rstrip())
+        emit, self._buffer = self._buffer[:safe], self._buffer[safe:]
+        return emit
+
+    def finish(self):
+        """
+        Return whatever is still held back once the output has ended.
+        """
+        if self.stopped:
+            return ""
+        emit, self._buffer = self._buffer.rstrip(), ""
+        if not self._started:
+            emit = emit.lstrip()
+            for prefix in self.prefixes:
+                if emit.startswith(prefix):
+                    emit = emit[len(prefix):].lstrip()
+                    break
+        return emit
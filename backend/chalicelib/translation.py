@@ -0,0 +1,141 @@
+"""
+Full-length translation: text is split into paragraph segments under
+Amazon Translate's request size, the segments are translated concurrently
+and reassembled in order. Translated segments are cached, so repeated
+paragraphs and repeat requests skip the round trip.
+"""
+import hashlib
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from chalicelib import metrics
+
+log = logging.getLogger(__name__)
+
+# Amazon Translate accepts at most 10,000 bytes per request, keep well under
+TRANSLATE_MAX_BYTES = int(os.getenv('TRANSLATE_MAX_BYTES', '4900'))
+TRANSLATE_WORKERS = int(os.getenv('TRANSLATE_WORKERS', '8'))
+# Longest text translated in one request: 21 Translate calls for ASCII text,
+# up to 62 when every character takes three bytes as in Chinese or Japanese,
+# run TRANSLATE_WORKERS at a time
+TRANSLATE_MAX_CHARS = int(os.getenv('TRANSLATE_MAX_CHARS', '100000'))
+
+_PARAGRAPH_RE = re.compile(r'(\s*\n\s*)')
+_SENTENCE_RE = re.compile(r'(?<=[.!?])(\s+)')
+
+
+def _fit(text, limit):
+    """
+    Split text that is over limit bytes on sentences, then on bytes at a
+    character boundary. Returns (pieces, separators) for reassembly.
+    """
+    pieces, separators = [], []
+    parts = _SENTENCE_RE.split(text)
+    current = ""
+    for i in range(0, len(parts), 2):
+        sentence = parts[i]
+        gap = parts[i + 1] if i + 1 < len(parts) else ""
+        candidate = current + sentence
+        if current and len(candidate.encode('utf-8')) > limit:
+            pieces.append(current.rstrip())
+            separators.append(current[len(current.rstrip()):])
+            current = ""
+        while len(sentence.encode('utf-8')) > limit:
+            head = sentence.encode('utf-8')[:limit].decode('utf-8', errors='ignore')
+            pieces.append(head)
+            separators.append("")
+            sentence = sentence[len(head):]
+        current += sentence + gap
+    pieces.append(current.rstrip())
+    separators.append(current[len(current.rstrip()):])
+    return pieces, separators
+
+
+def split_for_translation(text, limit=TRANSLATE_MAX_BYTES):
+    """
+    Split text into (segments, separators): consecutive paragraphs packed,
+    with the whitespace between them, into segments of up to limit bytes.
+    Only a paragraph over the limit on its own is broken on sentences.
+    "".join(segment + separator) gives the text back.
+    """
+    segments, separators = [], []
+    current, current_size, current_gap = "", 0, ""
+    parts = _PARAGRAPH_RE.split(text)
+    for i in range(0, len(parts), 2):
+        paragraph = parts[i]
+        gap = parts[i + 1] if i + 1 < len(parts) else ""
+        size = len(paragraph.encode('utf-8'))
+        if current and (not paragraph or current_size + len(current_gap.encode('utf-8')) + size > limit):
+            segments.append(current)
+            separators.append(current_gap)
+            current, current_size, current_gap = "", 0, ""
+        if not paragraph:
+            # Leading whitespace, or an empty text
+            segments.append(paragraph)
+            separators.append(gap)
+        elif size > limit:
+            pieces, gaps = _fit(paragraph, limit)
+            gaps[-1] += gap
+            segments.extend(pieces)
+            separators.extend(gaps)
+        elif current:
+            current_size += len(current_gap.encode('utf-8')) + size
+            current += current_gap + paragraph
+            current_gap = gap
+        else:
+            current, current_size, current_gap = paragraph, size, gap
+    if current:
+        segments.append(current)
+        separators.append(current_gap)
+    return segments, separators
+
+
+def segment_key(segment, source_language, target_language):
+    segment_hash = hashlib.sha256(segment.encode()).hexdigest()
+    return f"{segment_hash}:{source_language}:{target_language}"
+
+
+def translate_document(client, text, target_language, source_language='auto', cache=None,
+                       max_workers=TRANSLATE_WORKERS):
+    """
+    Translate text of any length, return (translated text, source language).
+    With source_language "auto" the language is detected per segment and the
+    first detected one is reported.
+    """
+    segments, separators = split_for_translation(text)
+    translated = list(segments)
+    detected = {}
+    # Segment text -> positions, repeated segments are translated once
+    pending = {}
+    for i, segment in enumerate(segments):
+        if not segment.strip():
+            continue
+        cached = cache.get(segment_key(segment, source_language, target_language)) if cache is not None else None
+        if cached is not None:
+            translated[i], detected[i] = cached
+        else:
+            pending.setdefault(segment, []).append(i)
+
+    def translate(segment):
+        # SourceLanguageCode is required, "auto" lets Translate detect it
+        with metrics.upstream('translate'):
+            response = client.translate_text(
+                Text=segment,
+                SourceLanguageCode=source_language,
+                TargetLanguageCode=target_language
+            )
+        return response.get('TranslatedText', ''), response.get('SourceLanguageCode', source_language)
+
+    if pending:
+        log.info(f"Translating {len(pending)} unique segments of {len(segments)}")
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as pool:
+            for segment, result in zip(pending, pool.map(translate, pending)):
+                for i in pending[segment]:
+                    translated[i], detected[i] = result
+                if cache is not None:
+                    cache.set(segment_key(segment, source_language, target_language), list(result))
+
+    detected_language = next((detected[i] for i in sorted(detected)), source_language)
+    return "".join(segment + separator for segment, separator in zip(translated, separators)), detected_language
@@ -0,0 +1,127 @@
+"""
+Circuit breaker state machine, and the sentiment service and inference
+client releasing the half-open trial on every way out.
+
+Run from the backend directory:
+    python -m unittest discover tests
+"""
+import time
+import unittest
+
+import requests
+from botocore.exceptions import ClientError
+
+from chalicelib.inference import InferenceClient
+from chalicelib.resilience import CircuitBreaker, CircuitOpenError
+from chalicelib.sentiment import SentimentError, SentimentService
+
+
+def half_open_breaker():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    return breaker
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertRaises(CircuitOpenError, breaker.check)
+
+    def test_half_open_lets_one_trial_through(self):
+        breaker = half_open_breaker()
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_trial_success_closes(self):
+        breaker = half_open_breaker()
+        breaker.allow()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_trial_failure_reopens(self):
+        breaker = half_open_breaker()
+        breaker.allow()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_abandoned_trial_expires(self):
+        breaker = half_open_breaker()
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        time.sleep(0.02)
+        self.assertTrue(breaker.allow())
+
+
+class _Local:
+    languages = frozenset(['en'])
+
+    def analyze(self, text, language):
+        return {"dominant_sentiment": "neutral"}
+
+
+class _Remote:
+    def __init__(self, error=None):
+        self.error = error
+
+    def analyze(self, text, language):
+        if self.error:
+            raise self.error
+        return {"dominant_sentiment": "positive"}
+
+
+class SentimentServiceTrialTest(unittest.TestCase):
+    def test_empty_text_does_not_take_the_trial(self):
+        breaker = half_open_breaker()
+        service = SentimentService(_Remote(), _Local(), breaker)
+        self.assertRaises(SentimentError, service.analyze, "   ", 'en', 'comprehend')
+        self.assertEqual(service.analyze("Good news", 'en', 'comprehend')["engine"], 'comprehend')
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_unexpected_error_releases_the_trial(self):
+        breaker = half_open_breaker()
+        service = SentimentService(_Remote(SentimentError("no segments")), _Local(), breaker)
+        self.assertRaises(SentimentError, service.analyze, "Good news", 'en', 'comprehend')
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker._trial_running)
+
+    def test_client_error_falls_back_and_reopens(self):
+        breaker = half_open_breaker()
+        error = ClientError({"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, "BatchDetectSentiment")
+        service = SentimentService(_Remote(error), _Local(), breaker)
+        self.assertEqual(service.analyze("Good news", 'en', 'auto')["engine"], 'local')
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+
+class _BrokenStream:
+    status_code = 503
+
+    @property
+    def text(self):
+        raise requests.exceptions.ChunkedEncodingError("Connection broken")
+
+
+class _Session:
+    def post(self, url, **kwargs):
+        return _BrokenStream()
+
+
+class InferenceClientTrialTest(unittest.TestCase):
+    def test_unexpected_error_releases_the_trial(self):
+        breaker = half_open_breaker()
+        client = InferenceClient('key', breaker=breaker)
+        client.session = _Session()
+        self.assertRaises(requests.exceptions.ChunkedEncodingError, client.generate, 'model', {})
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker._trial_running)
+
+
+if __name__ == '__main__':
+    unittest.main()